@@ -9,6 +9,7 @@ from .trajectoriesAlgorithm import (
     help_str_base,
     help_str_traj,
 )
+from .workerPool import apply_in_pool
 
 
 class CleaningAlgorithm(TrajectoryManipulationAlgorithm):
@@ -57,9 +58,15 @@ class OutlierCleanerAlgorithm(CleaningAlgorithm):
 
     def processTc(self, tc, parameters, context):
         v_max = self.parameterAsDouble(parameters, self.TOLERANCE, context)
-        generalized = OutlierCleaner(tc).clean(
-            v_max=v_max, units=tuple(self.speed_units)
+        generalized = apply_in_pool(
+            OutlierCleaner,
+            "clean",
+            tc,
+            self.cpu_count,
+            self.task_size,
+            pool_size=self.pool_size,
+            v_max=v_max,
+            units=tuple(self.speed_units),
         )
         self.tc_to_sink(generalized)
-        for traj in generalized:
-            self.traj_to_sink(traj)
+        self.trajs_to_sink(generalized)
@@ -35,5 +35,4 @@ class CreateTrajectoriesAlgorithm(TrajectoryManipulationAlgorithm):
 
     def processTc(self, tc, parameters, context):
         self.tc_to_sink(tc)
-        for traj in tc.trajectories:
-            self.traj_to_sink(traj)
+        self.trajs_to_sink(tc.trajectories)
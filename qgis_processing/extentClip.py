@@ -0,0 +1,151 @@
+from copy import copy
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from movingpandas import Trajectory
+
+from .trajectoryKernels import (
+    concat_ranges,
+    group_lengths,
+    traj_xy,
+    trajectory_offsets,
+    trajectory_times,
+)
+
+TIME_TOLERANCE = 10**7  # ns, MovingPandas treats closer timestamps as equal
+
+
+def clip_segments(xs, ys, xmin, ymin, xmax, ymax):
+    """Return the parameters u0, u1 of the part of each segment in a rectangle
+
+    Segment i runs from point i to point i + 1. Uses the Liang-Barsky
+    algorithm on all segments at once. u0 < u1 only for segments that
+    overlap the closed rectangle along a line.
+    """
+    x0, y0 = xs[:-1], ys[:-1]
+    dx, dy = np.diff(xs), np.diff(ys)
+    u0 = np.zeros(len(dx))
+    u1 = np.ones(len(dx))
+    edges = [(-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in edges:
+            r = q / p
+            u0 = np.where(p < 0, np.maximum(u0, r), u0)
+            u1 = np.where(p > 0, np.minimum(u1, r), u1)
+            u1[(p == 0) & (q < 0)] = -1  # parallel to and outside of the edge
+    return u0, u1
+
+
+def _interpolate(values, segments, u):
+    return values[segments] + (values[segments + 1] - values[segments]) * u
+
+
+def _interpolate_times(ts, segments, u):
+    dt = (ts[segments + 1] - ts[segments]) * u
+    t = ts[segments] + dt.astype(np.int64)
+    return t - t % 1000  # MovingPandas keeps microseconds only
+
+
+def clip_by_extent(tc, xmin, ymin, xmax, ymax):
+    """Clip all trajectories of tc by a rectangle in one pass
+
+    Each segment is a contiguous run of the trajectory inside the closed
+    rectangle: it starts where the trajectory enters the rectangle and ends
+    where it leaves it. This differs from tc.clip(), which also splits the
+    trajectory where its line crosses itself or stays at one place, and may
+    return many more segments. The clipping is done on the stacked
+    coordinates of all trajectories, entry and exit points are interpolated
+    in space and time and get the attributes of the preceding point.
+    Segments are named <id>_<n> and segments shorter than tc.min_length are
+    dropped.
+    """
+    trajs = tc.trajectories
+    result = copy(tc)
+    result.trajectories = []
+    if not trajs:
+        return result
+    offsets = trajectory_offsets(trajs)
+    coords = [traj_xy(traj) for traj in trajs]
+    xs = np.concatenate([x for x, _ in coords])
+    ys = np.concatenate([y for _, y in coords])
+    ts = trajectory_times(trajs)
+    codes = np.repeat(np.arange(len(trajs)), np.diff(offsets))
+
+    u0, u1 = clip_segments(xs, ys, xmin, ymin, xmax, ymax)
+    inside = np.flatnonzero((u0 < u1) & (codes[1:] == codes[:-1]))
+    if not len(inside):
+        return result
+    u0, u1 = u0[inside], u1[inside]
+    t0 = _interpolate_times(ts, inside, u0)
+    t0 = np.where(t0 - ts[inside] < TIME_TOLERANCE, ts[inside], t0)
+    tn = _interpolate_times(ts, inside, u1)
+    tn = np.where(ts[inside + 1] - tn < TIME_TOLERANCE, ts[inside + 1], tn)
+
+    # merge the parts of consecutive segments that touch
+    gap = t0[1:] - tn[:-1]
+    touching = (codes[inside[1:]] == codes[inside[:-1]]) & (gap >= 0)
+    touching &= gap < TIME_TOLERANCE
+    starts = np.flatnonzero(np.concatenate([[True], ~touching]))
+    ends = np.concatenate([starts[1:], [len(inside)]]) - 1
+    first, last = inside[starts], inside[ends]
+    u0, u1, t0, tn = u0[starts], u1[ends], t0[starts], tn[ends]
+    valid = t0 < tn
+    first, last, u0, u1, t0, tn = (a[valid] for a in (first, last, u0, u1, t0, tn))
+    n_segments = len(first)
+    if not n_segments:
+        return result
+
+    # rows of each segment: entry point, original points, exit point
+    between, numbers = concat_ranges(first + 1, last - first)
+    keep = (ts[between] > t0[numbers]) & (ts[between] < tn[numbers])
+    between, numbers = between[keep], numbers[keep]
+    ids = np.arange(n_segments)
+    order = np.argsort(
+        np.concatenate([3 * ids, 3 * numbers + 1, 3 * ids + 2]), kind="stable"
+    )
+    exit_rows = np.where(tn == ts[last + 1], last + 1, last)
+    rows = np.concatenate([first, between, exit_rows])[order]
+    numbers = np.concatenate([ids, numbers, ids])[order]
+    out_xs = np.concatenate(
+        [_interpolate(xs, first, u0), xs[between], _interpolate(xs, last, u1)]
+    )[order]
+    out_ys = np.concatenate(
+        [_interpolate(ys, first, u0), ys[between], _interpolate(ys, last, u1)]
+    )[order]
+    out_ts = np.concatenate([t0, ts[between], tn])[order]
+
+    if tc.min_length:
+        lengths = group_lengths(out_xs, out_ys, numbers, n_segments, trajs[0].is_latlon)
+        long_enough = lengths >= tc.min_length
+    else:
+        long_enough = np.ones(n_segments, dtype=bool)
+
+    template = trajs[0]
+    df = pd.concat([traj.df for traj in trajs]).iloc[rows]
+    x, y = template.x, template.y
+    if x in df.columns and y in df.columns:
+        df[x], df[y] = out_xs, out_ys
+    else:
+        df[template.get_geom_col()] = shapely.points(out_xs, out_ys)
+    df.index = pd.DatetimeIndex(
+        out_ts.astype("datetime64[ns]"), name=template.df.index.name
+    ).as_unit(template.df.index.unit)
+
+    traj_codes = codes[first]
+    counters = ids - np.searchsorted(traj_codes, traj_codes)
+    bounds = np.searchsorted(numbers, np.arange(n_segments + 1))
+    for i in np.flatnonzero(long_enough):
+        traj = trajs[traj_codes[i]]
+        result.trajectories.append(
+            Trajectory(
+                df.iloc[bounds[i] : bounds[i + 1]],
+                f"{traj.id}_{counters[i]}",
+                traj_id_col=traj.get_traj_id_col(),
+                x=x,
+                y=y,
+                crs=traj.crs,
+            )
+        )
+    return result
@@ -1,5 +1,4 @@
 import pandas as pd
-from movingpandas import TrajectoryStopDetector
 
 from qgis.PyQt.QtCore import QVariant
 from qgis.core import (
@@ -14,7 +13,8 @@ from qgis.core import (
 )
 
 from .trajectoriesAlgorithm import TrajectoriesAlgorithm, help_str_base
-from .qgisUtils import feature_from_gdf_row
+from .qgisUtils import features_from_gdf
+from .workerPool import stop_points_in_pool
 
 
 class ExtractODPtsAlgorithm(TrajectoriesAlgorithm):
@@ -58,6 +58,9 @@ class ExtractODPtsAlgorithm(TrajectoriesAlgorithm):
             "<p>Extracts start and/or end points of trajectories.</p>" + help_str_base
         )
 
+    def get_input_field_names(self, parameters, context):
+        return None  # all input attributes are copied to the OD points
+
     def processAlgorithm(self, parameters, context, feedback):
         tc, crs = self.create_tc(parameters, context)
 
@@ -98,22 +101,17 @@ class ExtractODPtsAlgorithm(TrajectoriesAlgorithm):
         gdf = gdf.convert_dtypes()
         gdf[self.timestamp_field] = gdf[self.timestamp_field].astype(str)
         names = [field.name() for field in self.fields_pts]
-        names.append("geometry")
-        gdf = gdf[names]
         # QgsMessageLog.logMessage(str(gdf), "Trajectools", level=Qgis.Info )
 
-        for _, row in gdf.iterrows():
-            f = feature_from_gdf_row(row)
-            self.sink_orig.addFeature(f, QgsFeatureSink.FastInsert)
+        for features in features_from_gdf(gdf, names):
+            self.sink_orig.addFeatures(features, QgsFeatureSink.FastInsert)
 
         gdf = tc.get_end_locations()
         gdf = gdf.convert_dtypes()
         gdf[self.timestamp_field] = gdf[self.timestamp_field].astype(str)
-        gdf = gdf[names]
 
-        for _, row in gdf.iterrows():
-            f = feature_from_gdf_row(row)
-            self.sink_dest.addFeature(f, QgsFeatureSink.FastInsert)
+        for features in features_from_gdf(gdf, names):
+            self.sink_dest.addFeatures(features, QgsFeatureSink.FastInsert)
 
 
 class ExtractStopsAlgorithm(TrajectoriesAlgorithm):
@@ -196,22 +194,19 @@ class ExtractStopsAlgorithm(TrajectoriesAlgorithm):
         min_duration = self.parameterAsString(parameters, self.MIN_DURATION, context)
         min_duration = pd.Timedelta(min_duration).to_pytimedelta()
 
-        try:
-            gdf = TrajectoryStopDetector(
-                tc, n_processes=self.cpu_count
-            ).get_stop_points(max_diameter=max_diameter, min_duration=min_duration)
-        except TypeError:
-            raise TypeError(
-                "TypeError: cannot pickle 'QVariant' object. This error is usually caused by None values in input layer fields. Try to remove None values or run without Add movement metrics."  # noqa E501
-            )
+        gdf = stop_points_in_pool(
+            tc,
+            self.cpu_count,
+            max_diameter,
+            min_duration,
+            self.task_size,
+            pool_size=self.pool_size,
+        )
 
         gdf = gdf.convert_dtypes()
         gdf["stop_id"] = gdf.index.astype(str)
 
         names = [field.name() for field in self.fields_pts]
-        names.append("geometry")
-        gdf = gdf[names]
 
-        for _, row in gdf.iterrows():
-            f = feature_from_gdf_row(row)
-            self.sink.addFeature(f, QgsFeatureSink.FastInsert)
+        for features in features_from_gdf(gdf, names):
+            self.sink.addFeatures(features, QgsFeatureSink.FastInsert)
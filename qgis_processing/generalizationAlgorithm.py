@@ -17,6 +17,7 @@ from .trajectoriesAlgorithm import (
     help_str_base,
     help_str_traj,
 )
+from .workerPool import apply_in_pool
 
 
 class GeneralizeTrajectoriesAlgorithm(TrajectoryManipulationAlgorithm):
@@ -31,6 +32,17 @@ class GeneralizeTrajectoriesAlgorithm(TrajectoryManipulationAlgorithm):
     def groupId(self):
         return "TrajectoryGeneralization"
 
+    def generalize(self, generalizer_class, tc, tolerance):
+        return apply_in_pool(
+            generalizer_class,
+            "generalize",
+            tc,
+            self.cpu_count,
+            self.task_size,
+            pool_size=self.pool_size,
+            tolerance=tolerance,
+        )
+
 
 class DouglasPeuckerGeneralizerAlgorithm(GeneralizeTrajectoriesAlgorithm):
     def __init__(self):
@@ -64,10 +76,9 @@ class DouglasPeuckerGeneralizerAlgorithm(GeneralizeTrajectoriesAlgorithm):
 
     def processTc(self, tc, parameters, context):
         tolerance = self.parameterAsDouble(parameters, self.TOLERANCE, context)
-        generalized = DouglasPeuckerGeneralizer(tc).generalize(tolerance)
+        generalized = self.generalize(DouglasPeuckerGeneralizer, tc, tolerance)
         self.tc_to_sink(generalized)
-        for traj in generalized:
-            self.traj_to_sink(traj)
+        self.trajs_to_sink(generalized)
 
 
 class MinDistanceGeneralizerAlgorithm(GeneralizeTrajectoriesAlgorithm):
@@ -104,10 +115,9 @@ class MinDistanceGeneralizerAlgorithm(GeneralizeTrajectoriesAlgorithm):
 
     def processTc(self, tc, parameters, context):
         tolerance = self.parameterAsDouble(parameters, self.TOLERANCE, context)
-        generalized = MinDistanceGeneralizer(tc).generalize(tolerance)
+        generalized = self.generalize(MinDistanceGeneralizer, tc, tolerance)
         self.tc_to_sink(generalized)
-        for traj in generalized:
-            self.traj_to_sink(traj)
+        self.trajs_to_sink(generalized)
 
 
 class MinTimeDeltaGeneralizerAlgorithm(GeneralizeTrajectoriesAlgorithm):
@@ -145,10 +155,9 @@ class MinTimeDeltaGeneralizerAlgorithm(GeneralizeTrajectoriesAlgorithm):
     def processTc(self, tc, parameters, context):
         tolerance = self.parameterAsString(parameters, self.TOLERANCE, context)
         tolerance = pd.Timedelta(tolerance).to_pytimedelta()
-        generalized = MinTimeDeltaGeneralizer(tc).generalize(tolerance)
+        generalized = self.generalize(MinTimeDeltaGeneralizer, tc, tolerance)
         self.tc_to_sink(generalized)
-        for traj in generalized:
-            self.traj_to_sink(traj)
+        self.trajs_to_sink(generalized)
 
 
 class TopDownTimeRatioGeneralizerAlgorithm(GeneralizeTrajectoriesAlgorithm):
@@ -189,7 +198,6 @@ class TopDownTimeRatioGeneralizerAlgorithm(GeneralizeTrajectoriesAlgorithm):
 
     def processTc(self, tc, parameters, context):
         tolerance = self.parameterAsDouble(parameters, self.TOLERANCE, context)
-        generalized = TopDownTimeRatioGeneralizer(tc).generalize(tolerance)
+        generalized = self.generalize(TopDownTimeRatioGeneralizer, tc, tolerance)
         self.tc_to_sink(generalized)
-        for traj in generalized:
-            self.traj_to_sink(traj)
+        self.trajs_to_sink(generalized)
@@ -13,7 +13,6 @@ from qgis.core import (
     QgsField,
     QgsFields,
     QgsFeature,
-    QgsGeometry,
     QgsFeatureSink,
 )
 
@@ -26,6 +25,7 @@ except ImportError as error:
         "https://github.com/Bondify/gtfs_functions."
     ) from error
 
+from .qgisUtils import qgis_from_shapely
 
 pluginPath = os.path.dirname(__file__)
 
@@ -93,7 +93,7 @@ class GtfsStopsAlgorithm(QgsProcessingAlgorithm):
         feed = Feed(gtfs_file)
         stops = feed.stops
         for _, stop in stops.iterrows():
-            pt = QgsGeometry.fromWkt(stop.geometry.wkt)
+            pt = qgis_from_shapely(stop.geometry)
             f = QgsFeature()
             f.setGeometry(pt)
             attrs = [stop.stop_id]
@@ -185,7 +185,7 @@ class GtfsShapesAlgorithm(QgsProcessingAlgorithm):
         feed = Feed(gtfs_file)
         segments = feed.shapes
         for _, shape in segments.iterrows():
-            line = QgsGeometry.fromWkt(shape.geometry.wkt)
+            line = qgis_from_shapely(shape.geometry)
             f = QgsFeature()
             f.setGeometry(line)
             attrs = [shape.shape_id]
@@ -273,7 +273,7 @@ class GtfsSegmentsAlgorithm(QgsProcessingAlgorithm):
         feed = Feed(gtfs_file)
         segments = self.get_segments(feed, add_avg_speed)
         for _, segment in segments.iterrows():
-            line = QgsGeometry.fromWkt(segment.geometry.wkt)
+            line = qgis_from_shapely(segment.geometry)
             f = QgsFeature()
             f.setGeometry(line)
             attrs = [
@@ -0,0 +1,114 @@
+import os
+import json
+import threading
+import hashlib
+import pandas as pd
+
+from qgis.core import QgsApplication, QgsProviderRegistry, QgsVectorLayer
+
+try:  # Parquet support is optional
+    import pyarrow  # noqa F401
+except ImportError:
+    pyarrow = None
+
+CACHE_MAX_BYTES = 4 * 1024**3  # evict least recently used files above this size
+CACHE_SUFFIX = ".parquet"
+
+
+def default_cache_dir():
+    return os.path.join(QgsApplication.qgisSettingsDirPath(), "trajectools", "cache")
+
+
+def layer_file_stat(layer):
+    """Return the os.stat() result of the file a layer reads, or None"""
+    parts = QgsProviderRegistry.instance().decodeUri(
+        layer.providerType(), layer.source()
+    )
+    file_path = parts.get("path", "")
+    if not file_path or not os.path.isfile(file_path):
+        return None
+    return os.stat(file_path)
+
+
+def cache_key(
+    layer, time_field_name, trajectory_id_field, field_names=None, filters=None
+):
+    """Return a key identifying the point table read from layer, or None
+
+    The key covers the layer source, the file modification time and size, the
+    CRS, the trajectory ID and timestamp fields, the fields read and any
+    ingestion filters (given as a list of JSON serializable values). Layers
+    that are not backed by a file on disk, or that have unsaved edits, cannot
+    be cached.
+    """
+    if pyarrow is None or not isinstance(layer, QgsVectorLayer):
+        return None
+    if layer.isModified():
+        return None
+    stat = layer_file_stat(layer)
+    if stat is None:
+        return None
+    if field_names is None:
+        field_names = [field.name() for field in layer.fields()]
+    key = {
+        "provider": layer.providerType(),
+        "source": layer.source(),
+        "subset": layer.subsetString(),
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "crs": layer.sourceCrs().authid(),
+        "traj_id_field": trajectory_id_field,
+        "time_field": time_field_name,
+        "fields": sorted(field_names),
+        "filters": filters,
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def load_cached_df(key, cache_dir=None):
+    """Return the cached point table for key, or None if it is not cached"""
+    file_path = os.path.join(cache_dir or default_cache_dir(), key + CACHE_SUFFIX)
+    if not os.path.isfile(file_path):
+        return None
+    try:
+        df = pd.read_parquet(file_path)
+    except (ValueError, TypeError, OSError):
+        return None
+    os.utime(file_path)  # mark as recently used
+    return df
+
+
+def store_cached_df(key, df, cache_dir=None, max_bytes=CACHE_MAX_BYTES):
+    """Write the point table to the cache and evict old entries
+
+    Returns False if the table cannot be stored as Parquet, e.g. because a
+    column contains values without an Arrow equivalent.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    file_path = os.path.join(cache_dir, key + CACHE_SUFFIX)
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        df.to_parquet(tmp_path, index=False)
+    except (ValueError, TypeError, NotImplementedError, OSError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, file_path)
+    evict(cache_dir, max_bytes)
+    return True
+
+
+def evict(cache_dir, max_bytes=CACHE_MAX_BYTES):
+    """Delete least recently used cache files until the cache fits max_bytes"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(CACHE_SUFFIX):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(cache_dir, name))
+        total -= size
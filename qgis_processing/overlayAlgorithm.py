@@ -1,5 +1,3 @@
-import shapely.wkt
-
 from qgis.PyQt.QtCore import QVariant
 from qgis.core import (
     QgsProcessingParameterExtent,
@@ -8,6 +6,9 @@ from qgis.core import (
     QgsField,
 )
 
+from .extentClip import clip_by_extent
+from .overlayCache import overlay_geometries, overlay_key
+from .spatialIndex import iter_clips, iter_intersections
 from .trajectoriesAlgorithm import (
     TrajectoryManipulationAlgorithm,
     help_str_base,
@@ -50,6 +51,10 @@ class ClipTrajectoriesByExtentAlgorithm(OverlayTrajectoriesAlgorithm):
         return self.tr(
             "<p>Creates a trajectory point layers with speed and direction information "
             "as well as a trajectory line layer clipped by the specified extent.</p>"
+            "<p>Each part of a trajectory that stays within the extent becomes one "
+            "segment, from where the trajectory enters the extent to where it leaves "
+            "it. Unlike the polygon clip, segments are not split where a "
+            "trajectory crosses itself.</p>"
             "" + help_str_base + help_str_traj
         )
 
@@ -58,14 +63,18 @@ class ClipTrajectoriesByExtentAlgorithm(OverlayTrajectoriesAlgorithm):
 
     def processTc(self, tc, parameters, context):
         extent = self.parameterAsExtent(parameters, self.EXTENT, context)
-        extent = shapely.wkt.loads(extent.asWktPolygon())
-        clipped = tc.clip(extent)
+        clipped = clip_by_extent(
+            tc,
+            extent.xMinimum(),
+            extent.yMinimum(),
+            extent.xMaximum(),
+            extent.yMaximum(),
+        )
         self.tc_to_sink(clipped)
-        for traj in clipped:
-            self.traj_to_sink(traj)
+        self.trajs_to_sink(clipped)
 
 
-class ClipTrajectoriesByPolygonLayerAlgorithm(OverlayTrajectoriesAlgorithm):
+class PolygonLayerOverlayAlgorithm(OverlayTrajectoriesAlgorithm):
     OVERLAY_LAYER = "OVERLAY_LAYER"
 
     def __init__(self):
@@ -81,6 +90,23 @@ class ClipTrajectoriesByPolygonLayerAlgorithm(OverlayTrajectoriesAlgorithm):
             )
         )
 
+    def prepare_parameters(self, parameters, context):
+        super().prepare_parameters(parameters, context)
+        overlay = self.parameterAsSource(parameters, self.OVERLAY_LAYER, context)
+        self.overlay_fields = overlay.fields()
+        layer = self.get_unfiltered_layer(parameters, self.OVERLAY_LAYER, context)
+        self.overlay_key = overlay_key(layer)
+
+    def get_overlay(self, parameters, context):
+        """Geometries of the overlay layer, reused if the layer is unchanged"""
+        overlay = self.parameterAsSource(parameters, self.OVERLAY_LAYER, context)
+        return overlay_geometries(overlay, self.overlay_key)
+
+
+class ClipTrajectoriesByPolygonLayerAlgorithm(PolygonLayerOverlayAlgorithm):
+    def __init__(self):
+        super().__init__()
+
     def name(self):
         return "clip_traj_vector"
 
@@ -99,30 +125,25 @@ class ClipTrajectoriesByPolygonLayerAlgorithm(OverlayTrajectoriesAlgorithm):
         return "https://movingpandas.org/units"
 
     def processTc(self, tc, parameters, context):
-        vlayer = self.parameterAsVectorLayer(parameters, self.OVERLAY_LAYER, context)
-        for feature in vlayer.getFeatures():
-            shapely_feature = shapely.wkt.loads(feature.geometry().asWkt())
-            clipped = tc.clip(shapely_feature)
+        overlay = self.get_overlay(parameters, context)
+        for clipped in iter_clips(
+            tc,
+            overlay.geometries,
+            self.cpu_count,
+            self.task_size,
+            pool_size=self.pool_size,
+            tiles=(overlay.tiles, overlay.owners),
+        ):
             self.tc_to_sink(clipped)
-            for traj in clipped:
-                self.traj_to_sink(traj)
+            self.trajs_to_sink(clipped)
 
 
-class IntersectWithPolygonLayerAlgorithm(OverlayTrajectoriesAlgorithm):
-    OVERLAY_LAYER = "OVERLAY_LAYER"
-
+class IntersectWithPolygonLayerAlgorithm(PolygonLayerOverlayAlgorithm):
     def __init__(self):
         super().__init__()
 
     def initAlgorithm(self, config=None):
         super().initAlgorithm(config)
-        self.addParameter(
-            QgsProcessingParameterVectorLayer(
-                name=self.OVERLAY_LAYER,
-                description=self.tr("Overlay layer"),
-                optional=False,
-            )
-        )
 
         import movingpandas as mpd
 
@@ -160,12 +181,11 @@ class IntersectWithPolygonLayerAlgorithm(OverlayTrajectoriesAlgorithm):
             ]
         self.fields_pts = self.get_pt_fields(fields_to_add)
 
-        vlayer = self.parameterAsVectorLayer(parameters, self.OVERLAY_LAYER, context)
-        for field in vlayer.fields():
+        for field in self.overlay_fields:
             field.setName(f"intersecting_{field.name()}")
             self.fields_pts.append(field)
 
-        (self.sink_pts, self.dest_pts) = self.parameterAsSink(
+        self.sink_pts, self.dest_pts = self.parameterAsSink(
             parameters,
             self.OUTPUT_PTS,
             context,
@@ -177,12 +197,11 @@ class IntersectWithPolygonLayerAlgorithm(OverlayTrajectoriesAlgorithm):
     def setup_traj_sink(self, parameters, context, crs):
         self.fields_trajs = self.get_traj_fields()
 
-        vlayer = self.parameterAsVectorLayer(parameters, self.OVERLAY_LAYER, context)
-        for field in vlayer.fields():
+        for field in self.overlay_fields:
             field.setName(f"intersecting_{field.name()}")
             self.fields_trajs.append(field)
 
-        (self.sink_trajs, self.dest_trajs) = self.parameterAsSink(
+        self.sink_trajs, self.dest_trajs = self.parameterAsSink(
             parameters,
             self.OUTPUT_TRAJS,
             context,
@@ -192,20 +211,18 @@ class IntersectWithPolygonLayerAlgorithm(OverlayTrajectoriesAlgorithm):
         )
 
     def processTc(self, tc, parameters, context):
-        vlayer = self.parameterAsVectorLayer(parameters, self.OVERLAY_LAYER, context)
-        layer_fields = vlayer.fields()
-        field_names = [field.name() for field in layer_fields]
-        field_names_to_add = [f"intersecting_{name}" for name in field_names]
-
-        for feature in vlayer.getFeatures():
-            attrs = feature.attributes()
-
-            shapely_feature = {
-                "geometry": shapely.wkt.loads(feature.geometry().asWkt()),
-                "properties": dict(zip(field_names, attrs)),
-            }
-            intersecting = tc.intersection(shapely_feature)
-
+        field_names_to_add = [
+            f"intersecting_{name}" for name in self.overlay_fields.names()
+        ]
+        overlay = self.get_overlay(parameters, context)
+        for intersecting in iter_intersections(
+            tc,
+            overlay.geometries,
+            overlay.properties,
+            self.cpu_count,
+            self.task_size,
+            pool_size=self.pool_size,
+            tiles=(overlay.tiles, overlay.owners),
+        ):
             self.tc_to_sink(intersecting, field_names_to_add=field_names_to_add)
-            for traj in intersecting:
-                self.traj_to_sink(traj, attr_first_to_add=field_names_to_add)
+            self.trajs_to_sink(intersecting, attr_first_to_add=field_names_to_add)
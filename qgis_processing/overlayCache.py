@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+
+from qgis.core import QgsVectorLayer
+
+from .ingestionCache import layer_file_stat
+from .qgisUtils import shapely_from_source
+
+OVERLAY_CACHE_SIZE = 8  # number of overlay layers kept in memory
+TILE_MAX_VERTICES = 256  # polygons with more vertices are split into tiles
+TILE_MAX_DEPTH = 8  # maximum number of times a polygon is split into quadrants
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()  # algorithms may run in several threads
+
+
+def tile_geometry(geometry, max_vertices=TILE_MAX_VERTICES, depth=TILE_MAX_DEPTH):
+    """Split a geometry into tiles of at most max_vertices vertices
+
+    The geometry is intersected with the quadrants of its bounding box until
+    the parts are small enough, or depth splits have been made. The tiles have
+    much tighter bounding boxes than large polygons like coastlines or
+    administrative areas, and are faster to test against. Invalid geometries,
+    e.g. self-intersecting polygons, cannot be intersected and are kept whole.
+    """
+    if depth == 0 or shapely.get_num_coordinates(geometry) <= max_vertices:
+        return [geometry]
+    if not shapely.is_valid(geometry):
+        return [geometry]
+    xmin, ymin, xmax, ymax = geometry.bounds
+    xmid, ymid = (xmin + xmax) / 2, (ymin + ymax) / 2
+    quadrants = shapely.intersection(
+        geometry,
+        shapely.box(
+            [xmin, xmid, xmin, xmid],
+            [ymin, ymin, ymid, ymid],
+            [xmid, xmax, xmid, xmax],
+            [ymid, ymid, ymax, ymax],
+        ),
+    )
+    return [
+        tile
+        for quadrant in quadrants
+        if not quadrant.is_empty
+        for tile in tile_geometry(quadrant, max_vertices, depth - 1)
+    ]
+
+
+class OverlayGeometries:
+    """Parsed and prepared geometries and attributes of an overlay layer
+
+    geometries is an array of prepared shapely geometries, None for features
+    without geometry, and properties a dict of attribute values per feature.
+    tiles holds the prepared tiles of all geometries and owners the position
+    of the geometry each tile belongs to.
+    """
+
+    def __init__(self, geometries, properties, max_vertices=TILE_MAX_VERTICES):
+        self.geometries = geometries
+        self.properties = properties
+        shapely.prepare(geometries)
+        tiles = [
+            tile_geometry(geometry, max_vertices) if geometry is not None else []
+            for geometry in geometries
+        ]
+        self.owners = np.repeat(np.arange(len(tiles)), [len(t) for t in tiles])
+        self.tiles = np.array([tile for t in tiles for tile in t], dtype=object)
+        shapely.prepare(self.tiles)
+
+
+def overlay_key(layer):
+    """Return a key identifying the features of an overlay layer, or None
+
+    The key covers the layer source, subset string, CRS and the modification
+    time and size of its file. Layers that are not backed by a file on disk,
+    or that have unsaved edits, cannot be cached.
+    """
+    if not isinstance(layer, QgsVectorLayer) or layer.isModified():
+        return None
+    stat = layer_file_stat(layer)
+    if stat is None:
+        return None
+    return (
+        layer.providerType(),
+        layer.source(),
+        layer.subsetString(),
+        layer.sourceCrs().authid(),
+        stat.st_mtime_ns,
+        stat.st_size,
+    )
+
+
+def overlay_geometries(source, key=None):
+    """Return the OverlayGeometries of a feature source
+
+    If a key is given, the geometries are kept in memory for the session and
+    reused by later runs with the same key, evicting the least recently used
+    layers above OVERLAY_CACHE_SIZE.
+    """
+    if key is None:
+        return OverlayGeometries(*shapely_from_source(source))
+    with _cache_lock:
+        overlay = _cache.get(key)
+        if overlay is not None:
+            _cache.move_to_end(key)
+            return overlay
+    overlay = OverlayGeometries(*shapely_from_source(source))
+    with _cache_lock:
+        _cache[key] = overlay
+        while len(_cache) > OVERLAY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return overlay
+
+
+def clear_overlay_cache():
+    """Forget all cached overlay geometries"""
+    with _cache_lock:
+        _cache.clear()
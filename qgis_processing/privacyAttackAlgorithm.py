@@ -26,6 +26,11 @@ class HomeWorkAttack(TrajectoryManipulationAlgorithm):
     def __init__(self):
         super().__init__()
 
+    def initAlgorithm(self, config=None):
+        super().initAlgorithm(config)
+        # the attack needs all points at once, it cannot run in chunks
+        self.removeParameter(self.CHUNK_SIZE)
+
     def icon(self):
         return QIcon(os.path.join(pluginPath, "icons", "skmob.png"))
 
@@ -58,6 +63,9 @@ class HomeWorkAttack(TrajectoryManipulationAlgorithm):
     def createInstance(self):
         return type(self)()
 
+    def get_input_field_names(self, parameters, context):
+        return None  # skmob gets all input attributes, which are merged back
+
     def processAlgorithm(self, parameters, context, feedback):
         df = self.create_df(parameters, context)
         df_copy = df.drop(
@@ -79,24 +87,26 @@ class HomeWorkAttack(TrajectoryManipulationAlgorithm):
         tc = tc_from_df(
             df, self.timestamp_field, self.traj_id_field, crs_no, self.min_length
         )
-        tc.add_speed(units=tuple(self.speed_units), overwrite=True)
-        tc.add_direction(overwrite=True)
-
-        self.fields_pts = self.get_pt_fields(
-            [
-                QgsField(tc.get_speed_col(), QVariant.Double),
-                QgsField(tc.get_direction_col(), QVariant.Double),
-                QgsField("risk", QVariant.Double),
-            ],
-        )
-        (self.sink_pts, self.dest_pts) = self.parameterAsSink(
-            parameters,
-            self.OUTPUT_PTS,
-            context,
-            self.fields_pts,
-            QgsWkbTypes.Point,
-            crs,
-        )
+        self.sink_pts, self.dest_pts = None, None
+        if self.output_pts:  # speed and direction are only written to the points
+            tc.add_speed(units=tuple(self.speed_units), overwrite=True)
+            tc.add_direction(overwrite=True)
+
+            self.fields_pts = self.get_pt_fields(
+                [
+                    QgsField(tc.get_speed_col(), QVariant.Double),
+                    QgsField(tc.get_direction_col(), QVariant.Double),
+                    QgsField("risk", QVariant.Double),
+                ],
+            )
+            (self.sink_pts, self.dest_pts) = self.parameterAsSink(
+                parameters,
+                self.OUTPUT_PTS,
+                context,
+                self.fields_pts,
+                QgsWkbTypes.Point,
+                crs,
+            )
 
         self.fields_trajs = self.get_traj_fields([QgsField("risk", QVariant.Double)])
         (self.sink_trajs, self.dest_trajs) = self.parameterAsSink(
@@ -114,12 +124,13 @@ class HomeWorkAttack(TrajectoryManipulationAlgorithm):
 
     def processTc(self, tc):
         self.tc_to_sink(tc)
-        for traj in tc.trajectories:
-            self.traj_to_sink(traj, attr_mean_to_add=["risk"])
+        self.trajs_to_sink(tc.trajectories, attr_mean_to_add=["risk"])
 
     def postProcessAlgorithm(self, context, feedback):
-        pts_layer = QgsProcessingUtils.mapLayerFromString(self.dest_pts, context)
-        pts_layer.loadNamedStyle(os.path.join(pluginPath, "styles", "pts.qml"))
-        traj_layer = QgsProcessingUtils.mapLayerFromString(self.dest_trajs, context)
-        traj_layer.loadNamedStyle(os.path.join(pluginPath, "styles", "risk.qml"))
+        if self.dest_pts:
+            pts_layer = QgsProcessingUtils.mapLayerFromString(self.dest_pts, context)
+            pts_layer.loadNamedStyle(os.path.join(pluginPath, "styles", "pts.qml"))
+        if self.dest_trajs:
+            traj_layer = QgsProcessingUtils.mapLayerFromString(self.dest_trajs, context)
+            traj_layer.loadNamedStyle(os.path.join(pluginPath, "styles", "risk.qml"))
         return {self.OUTPUT_PTS: self.dest_pts, self.OUTPUT_TRAJS: self.dest_trajs}
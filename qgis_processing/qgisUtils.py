@@ -1,22 +1,41 @@
 import sys
 import platform
 import multiprocessing
+import numpy as np
 import pandas as pd
+import shapely
 from os import path
 from pyproj import CRS
-from datetime import datetime
 
 from qgis.core import (
     QgsFeature,
+    QgsFeatureRequest,
+    QgsProviderRegistry,
+    QgsVectorLayer,
+    QgsWkbTypes,
     QgsGeometry,
+    QgsLineString,
     QgsPointXY,
+    QgsProcessingException,
     Qgis,
     NULL,
 )
-from qgis.PyQt.QtCore import QDateTime
+from qgis.PyQt.QtCore import QByteArray, QDate, QDateTime, QTime, QVariant
+
+try:  # pandas >= 2.2
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+try:  # optional Arrow-based fast path for file-backed layers
+    from pyogrio import read_dataframe
+    import pyarrow  # noqa F401
+except ImportError:
+    read_dataframe = None
 
 try:
     from movingpandas import TrajectoryCollection
+    from movingpandas.unit_utils import get_conversion
 except ImportError as error:
     raise ImportError(
         "Missing dependency. To use the trajectory analysis algorithms "
@@ -24,6 +43,15 @@ except ImportError as error:
         "https://codeberg.org/movingpandas/trajectools."
     ) from error
 
+from .trajectoryKernels import group_lengths, traj_xy
+
+INGEST_CHUNK_SIZE = 100000  # number of features read into memory at a time
+FEATURE_BATCH_SIZE = 10000  # number of features passed to a sink at a time
+UNIX_EPOCH = pd.Timestamp("1970-01-01")
+UNIX_EPOCH_JULIAN_DAY = 2440588
+OGR_FILE_EXTENSIONS = [".gpkg", ".fgb", ".shp"]
+TIME_FILTER_MARGIN = pd.Timedelta(days=1)  # more than any UTC offset
+
 
 def set_multiprocess_path():
     # This function is courtesy of the SemiAutomaticClassificationPlugin
@@ -83,38 +111,544 @@ def trajectories_from_qgis_point_layer(
     return tc_from_pt_layer(layer, time_field_name, trajectory_id_field, time_format)
 
 
-def df_from_pt_layer(layer, time_field_name, trajectory_id_field):
-    def to_date(dt):
-        if dt == NULL:
-            return None
-        if isinstance(dt, QDateTime):
-            return dt.toPyDateTime()
-        else:
-            return pd.to_datetime(dt)
-
-    names = [field.name() for field in layer.fields()]
-    data = []
-    for feature in layer.getFeatures():
-        my_dict = {}
-        for i, a in enumerate(feature.attributes()):
-            if a == NULL:
-                a = None
-            my_dict[names[i]] = a
+def _is_null(value):
+    return value is None or value == NULL
+
+
+_null_mask = np.frompyfunc(_is_null, 1, 1)
+
+
+def read_pt_columns(features, attr_indices, chunk_size=INGEST_CHUNK_SIZE):
+    """Yield (attribute columns, x, y) arrays for up to chunk_size features each
+
+    Attributes at attr_indices are written into preallocated object arrays, one
+    per field, and point coordinates into float64 arrays. No per-feature dicts
+    are created.
+    """
+    n_fields = len(attr_indices)
+    columns = [np.empty(chunk_size, dtype=object) for _ in range(n_fields)]
+    xs = np.empty(chunk_size, dtype=np.float64)
+    ys = np.empty(chunk_size, dtype=np.float64)
+    i = 0
+    for feature in features:
+        attrs = feature.attributes()
+        for column, j in zip(columns, attr_indices):
+            column[i] = attrs[j]
         pt = feature.geometry().asPoint()
-        my_dict["geom_x"] = pt.x()
-        my_dict["geom_y"] = pt.y()
-        data.append(my_dict)
-    df = pd.DataFrame(data)
-    df[time_field_name] = df[time_field_name].apply(lambda a: to_date(a))
+        xs[i] = pt.x()
+        ys[i] = pt.y()
+        i += 1
+        if i == chunk_size:
+            yield columns, xs, ys
+            columns = [np.empty(chunk_size, dtype=object) for _ in range(n_fields)]
+            xs = np.empty(chunk_size, dtype=np.float64)
+            ys = np.empty(chunk_size, dtype=np.float64)
+            i = 0
+    if i > 0:
+        yield [column[:i] for column in columns], xs[:i], ys[:i]
+
+
+def df_from_pt_columns(names, columns, xs, ys):
+    """Build a point table of plain NumPy/pandas values from read_pt_columns
+
+    NULLs become None (NaN/NaT once the column dtype is inferred) and Qt
+    values are converted by python_values, so the table can be pickled to
+    worker processes.
+    """
+    data = {}
+    for name, column in zip(names, columns):
+        if len(column):
+            column[_null_mask(column).astype(bool)] = None
+            column = python_values(column)
+        data[name] = column
+    df = pd.DataFrame(data, copy=False).infer_objects()
+    df["geom_x"] = xs
+    df["geom_y"] = ys
     return df
 
 
-def tc_from_pt_layer(layer, time_field_name, trajectory_id_field, min_length=0):
-    df = df_from_pt_layer(layer, time_field_name, trajectory_id_field)
-    crs = CRS(int(layer.sourceCrs().authid().split(":")[1]))
+def _qdatetime_to_msecs(dt):
+    if dt is None or not dt.isValid():
+        return np.nan
+    # keep the wall clock time, as QDateTime.toPyDateTime() does
+    return dt.toMSecsSinceEpoch() + dt.offsetFromUtc() * 1000
+
+
+_qdatetimes_to_msecs = np.frompyfunc(_qdatetime_to_msecs, 1, 1)
+_qdates_to_julian_days = np.frompyfunc(
+    lambda d: np.nan if d is None or not d.isValid() else d.toJulianDay(), 1, 1
+)
+_qtimes_to_py = np.frompyfunc(
+    lambda t: None if t is None or not t.isValid() else t.toPyTime(), 1, 1
+)
+_qbytearrays_to_py = np.frompyfunc(lambda b: None if b is None else bytes(b), 1, 1)
+_qvariants_to_py = np.frompyfunc(
+    lambda v: v.value() if isinstance(v, QVariant) else v, 1, 1
+)
+
+
+def python_values(column):
+    """Convert an object column of QGIS attribute values to pickle-safe values
+
+    NULLs must already be replaced by None. QDateTime and QDate columns become
+    datetime64 (NULL becomes NaT), QTime values become datetime.time,
+    QByteArray values become bytes and any remaining QVariant is unwrapped.
+    Other columns are returned unchanged. The type is taken from the first
+    non-NULL value, as all values of a field share the same type.
+    """
+    first = next((value for value in column if value is not None), None)
+    if isinstance(first, QDateTime):
+        msecs = _qdatetimes_to_msecs(column).astype(np.float64)
+        return pd.to_datetime(msecs, unit="ms").to_numpy()
+    if isinstance(first, QDate):
+        days = _qdates_to_julian_days(column).astype(np.float64)
+        return pd.to_datetime(days - UNIX_EPOCH_JULIAN_DAY, unit="D").to_numpy()
+    if isinstance(first, QTime):
+        return _qtimes_to_py(column)
+    if isinstance(first, QByteArray):
+        return _qbytearrays_to_py(column)
+    if isinstance(first, QVariant):
+        return _qvariants_to_py(column)
+    return column
+
+
+def guess_timestamp_format(values, sample_size=100):
+    """Return the strftime format of a string timestamp column, or None
+
+    The format is guessed from the first non-null value and checked against a
+    sample of sample_size values.
+    """
+    sample = values.dropna().iloc[:sample_size]
+    if sample.empty:
+        return None
+    fmt = guess_datetime_format(sample.iloc[0])
+    if fmt is None:
+        return None
+    try:
+        pd.to_datetime(sample, format=fmt)
+    except (ValueError, TypeError):
+        return None
+    return fmt
+
+
+def parse_timestamps(values):
+    """Convert a column of string or datetime values to datetime64
+
+    QDateTime values are already converted by python_values() when the points
+    are read. String values are parsed in a single call using a format
+    detected from a sample. NULL values become NaT.
+    """
+    values = pd.Series(values, copy=False)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    valid = values.dropna()
+    if valid.empty:
+        return pd.to_datetime(values)
+    first = valid.iloc[0]
+    if isinstance(first, str):
+        fmt = guess_timestamp_format(valid)
+        if fmt is not None:
+            try:
+                return pd.to_datetime(values, format=fmt)
+            except (ValueError, TypeError):
+                pass
+        return pd.to_datetime(values, format="mixed")  # inconsistent formats
+    return pd.to_datetime(values)
+
+
+def time_filter_range(layer, time_field_name, start_time=None, end_time=None):
+    """Return the time range to pre-filter the points of layer by, or None
+
+    Only DateTime fields are filtered by the data source. The data source may
+    compare the timestamps in another time zone than filter_time_range(),
+    so the range is widened by TIME_FILTER_MARGIN and the exact range is
+    applied afterwards. Returns (start, end) as naive ISO timestamps, None
+    for an open end.
+    """
+    if start_time is None and end_time is None:
+        return None
+    fields = layer.fields()
+    i = fields.indexFromName(time_field_name)
+    if i < 0 or fields.at(i).type() != QVariant.DateTime:
+        return None
+    bounds = []
+    for value, margin in [
+        (start_time, -TIME_FILTER_MARGIN),
+        (end_time, TIME_FILTER_MARGIN),
+    ]:
+        if value is not None:
+            value = pd.Timestamp(value)
+            if value.tzinfo is not None:
+                value = value.tz_convert(None)
+            value = (value + margin).strftime("%Y-%m-%dT%H:%M:%S")
+        bounds.append(value)
+    return tuple(bounds)
+
+
+def time_filter_clause(time_field_name, time_range, to_datetime=None):
+    """Return a SQL-like filter on a time field for time_filter_range()
+
+    to_datetime is the name of a function converting the ISO timestamps, as
+    QGIS expressions need them converted. OGR compares them as they are.
+    """
+    column = '"{}"'.format(time_field_name.replace('"', '""'))
+    terms = []
+    for op, value in zip([">=", "<="], time_range):
+        if value is not None:
+            value = f"'{value}'"
+            if to_datetime is not None:
+                value = f"{to_datetime}({value})"
+            terms.append(f"{column} {op} {value}")
+    return " AND ".join(terms)
+
+
+def pt_layer_request(
+    layer, field_names=None, extent=None, time_field_name=None, time_range=None
+):
+    """Return the attribute indices to read and a matching QgsFeatureRequest
+
+    If field_names is None, all attributes are read. Otherwise, only the listed
+    fields that exist in the layer are fetched from the provider. If extent is
+    given (in layer CRS), only features within it are fetched. If time_range
+    is given, see time_filter_range(), only features of that time range of
+    time_field_name are fetched.
+    """
+    fields = layer.fields()
+    request = QgsFeatureRequest()
+    if extent is not None:
+        request.setFilterRect(extent)
+    if time_range is not None:
+        request.setFilterExpression(
+            time_filter_clause(time_field_name, time_range, "to_datetime")
+        )
+    if field_names is None:
+        return list(range(fields.count())), request
+    indices = sorted({fields.indexFromName(name) for name in field_names} - {-1})
+    request.setSubsetOfAttributes(indices)
+    return indices, request
+
+
+def _parse_pt_column(column):
+    column = column.copy()
+    column[_null_mask(column).astype(bool)] = None
+    return parse_timestamps(python_values(column))
+
+
+def df_from_pt_features(
+    layer,
+    field_names=None,
+    chunk_size=INGEST_CHUNK_SIZE,
+    extent=None,
+    time_field_name=None,
+    start_time=None,
+    end_time=None,
+):
+    """Read point features through the QGIS provider into a DataFrame
+
+    If start_time or end_time are given, each chunk of features is filtered
+    by time_field_name before the chunks are joined. Timestamps are only
+    parsed for this, the caller still has to parse them.
+    """
+    time_range = None
+    if time_field_name is not None:
+        time_range = time_filter_range(layer, time_field_name, start_time, end_time)
+    indices, request = pt_layer_request(
+        layer, field_names, extent, time_field_name, time_range
+    )
+    names = [layer.fields().at(i).name() for i in indices]
+    features = layer.getFeatures(request)
+    time_column = None
+    if (start_time is not None or end_time is not None) and time_field_name in names:
+        time_column = names.index(time_field_name)
+    chunks = []
+    for columns, xs, ys in read_pt_columns(features, indices, chunk_size):
+        if time_column is not None:
+            keep = time_range_mask(
+                _parse_pt_column(columns[time_column]), start_time, end_time
+            )
+            columns = [column[keep] for column in columns]
+            xs, ys = xs[keep], ys[keep]
+        chunks.append((columns, xs, ys))
+    if len(chunks) == 1:
+        columns, xs, ys = chunks[0]
+    elif chunks:
+        columns = [np.concatenate(c) for c in zip(*[chunk[0] for chunk in chunks])]
+        xs = np.concatenate([chunk[1] for chunk in chunks])
+        ys = np.concatenate([chunk[2] for chunk in chunks])
+    else:
+        columns = [np.empty(0, dtype=object) for _ in names]
+        xs = ys = np.empty(0, dtype=np.float64)
+    return df_from_pt_columns(names, columns, xs, ys)
+
+
+def ogr_file_source(layer):
+    """Return (path, layer name, FID field) if layer is a plain point file on disk
+
+    Only unfiltered, unmodified GeoPackage, FlatGeobuf and Shapefile point
+    layers qualify, and only if pyogrio and pyarrow are installed. Returns None
+    for all other layers.
+    """
+    if read_dataframe is None or not isinstance(layer, QgsVectorLayer):
+        return None
+    if layer.providerType() != "ogr" or layer.subsetString() or layer.isModified():
+        return None
+    if QgsWkbTypes.flatType(layer.wkbType()) != QgsWkbTypes.Point:
+        return None
+    parts = QgsProviderRegistry.instance().decodeUri("ogr", layer.source())
+    file_path = parts.get("path", "")
+    extension = path.splitext(file_path)[1].lower()
+    if extension not in OGR_FILE_EXTENSIONS or not path.isfile(file_path):
+        return None
+    layer_name = parts.get("layerName") or parts.get("layerId")
+    fid_field = None
+    for i in layer.dataProvider().pkAttributeIndexes():
+        fid_field = layer.fields().at(i).name()
+    return file_path, layer_name, fid_field
+
+
+def df_from_ogr_file(
+    file_path,
+    layer_name=None,
+    field_names=None,
+    fid_field=None,
+    extent=None,
+    where=None,
+):
+    """Read a point file into a DataFrame using pyogrio's Arrow reader
+
+    This skips QgsFeature and QVariant objects entirely. The FID is not a
+    regular OGR field, so it is added from the index if fid_field is given.
+    where is an OGR SQL attribute filter.
+    """
+    columns = None
+    if field_names is not None:
+        columns = [name for name in field_names if name != fid_field]
+    bbox = None
+    if extent is not None:
+        bbox = (
+            extent.xMinimum(),
+            extent.yMinimum(),
+            extent.xMaximum(),
+            extent.yMaximum(),
+        )
+    gdf = read_dataframe(
+        file_path,
+        layer=layer_name,
+        columns=columns,
+        bbox=bbox,
+        where=where,
+        use_arrow=True,
+        fid_as_index=fid_field is not None,
+    )
+    xs = gdf.geometry.x.to_numpy()
+    ys = gdf.geometry.y.to_numpy()
+    df = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+    if fid_field is not None and (field_names is None or fid_field in field_names):
+        df.insert(0, fid_field, df.index.to_numpy())
+    df.reset_index(drop=True, inplace=True)
+    df["geom_x"] = xs
+    df["geom_y"] = ys
+    return df
+
+
+def df_from_pt_layer(
+    layer,
+    time_field_name,
+    trajectory_id_field,
+    field_names=None,
+    chunk_size=INGEST_CHUNK_SIZE,
+    extent=None,
+    start_time=None,
+    end_time=None,
+    file_source=None,
+):
+    """Read the point layer into a DataFrame with parsed timestamps
+
+    Plain point files are read directly from disk. file_source, as returned by
+    ogr_file_source, is looked up from layer if not given. The time range is
+    applied while reading, as far as the data source supports it.
+    """
+    if file_source is None:
+        file_source = ogr_file_source(layer)
+    if file_source is None:
+        df = df_from_pt_features(
+            layer,
+            field_names,
+            chunk_size,
+            extent,
+            time_field_name,
+            start_time,
+            end_time,
+        )
+    else:
+        file_path, layer_name, fid_field = file_source
+        time_range = time_filter_range(layer, time_field_name, start_time, end_time)
+        where = None
+        if time_range is not None:
+            where = time_filter_clause(time_field_name, time_range)
+        df = df_from_ogr_file(
+            file_path, layer_name, field_names, fid_field, extent, where
+        )
+    df[time_field_name] = parse_timestamps(df[time_field_name])
+    if start_time is not None or end_time is not None:
+        df = filter_time_range(df, time_field_name, start_time, end_time)
+    return df
+
+
+def _timestamp_like(value, t):
+    value = pd.Timestamp(value)
+    if t.dt.tz is not None and value.tzinfo is None:
+        return value.tz_localize(t.dt.tz)
+    if t.dt.tz is None and value.tzinfo is not None:
+        return value.tz_convert(None)
+    return value
+
+
+def df_chunks_from_pt_layer(
+    layer,
+    time_field_name,
+    trajectory_id_field,
+    field_names=None,
+    chunk_size=INGEST_CHUNK_SIZE,
+    extent=None,
+    start_time=None,
+    end_time=None,
+):
+    """Yield point DataFrames of roughly chunk_size points of whole trajectories
+
+    The layer has to be sorted by trajectory ID. The points of the last
+    trajectory in each chunk are held back and prepended to the next chunk, so
+    that no trajectory is split across chunks. Raises QgsProcessingException
+    if a trajectory shows up again after it has been yielded.
+    """
+    time_range = time_filter_range(layer, time_field_name, start_time, end_time)
+    indices, request = pt_layer_request(
+        layer, field_names, extent, time_field_name, time_range
+    )
+    names = [layer.fields().at(i).name() for i in indices]
+    features = layer.getFeatures(request)
+    carry = None
+    flushed = set()  # IDs of the trajectories yielded so far
+    for columns, xs, ys in read_pt_columns(features, indices, chunk_size):
+        df = df_from_pt_columns(names, columns, xs, ys)
+        df[time_field_name] = parse_timestamps(df[time_field_name])
+        if start_time is not None or end_time is not None:
+            df = filter_time_range(df, time_field_name, start_time, end_time)
+        if carry is not None:
+            df = pd.concat([carry, df], ignore_index=True)
+        if trajectory_id_field not in df.columns:
+            carry = df  # all points belong to a single trajectory
+            continue
+        ids = df[trajectory_id_field].to_numpy()
+        repeated = flushed.intersection(pd.unique(ids))
+        if repeated:
+            raise QgsProcessingException(
+                f"Trajectory {next(iter(repeated))} continues after it was "
+                "processed. Processing in chunks requires the input layer to "
+                "be sorted by trajectory ID."
+            )
+        changes = np.flatnonzero(ids[1:] != ids[:-1])
+        if len(changes) == 0:
+            carry = df
+            continue
+        last_start = changes[-1] + 1
+        flushed.update(pd.unique(ids[:last_start]))
+        yield df.iloc[:last_start].copy()
+        carry = df.iloc[last_start:].reset_index(drop=True)
+    if carry is not None and len(carry) > 0:
+        yield carry
+
+
+def time_range_mask(t, start_time=None, end_time=None):
+    """Return a boolean array, True for the timestamps of t in the time range"""
+    t = pd.Series(t, copy=False)
+    mask = np.ones(len(t), dtype=bool)
+    if start_time is not None:
+        mask &= (t >= _timestamp_like(start_time, t)).to_numpy()
+    if end_time is not None:
+        mask &= (t <= _timestamp_like(end_time, t)).to_numpy()
+    return mask
+
+
+def filter_time_range(df, time_field_name, start_time=None, end_time=None):
+    """Keep only rows with timestamps between start_time and end_time"""
+    mask = time_range_mask(df[time_field_name], start_time, end_time)
+    return df[mask].reset_index(drop=True)
+
+
+def compact_dtypes(df, trajectory_id_field):
+    """Convert point table columns to memory-efficient dtypes in place
+
+    Text trajectory IDs and other repetitive text columns become categoricals.
+    Integer and float attributes are downcast where this does not change any
+    values. Coordinates and timestamps are left as they are.
+    """
+    for name in df.columns:
+        if name in ["geom_x", "geom_y"]:
+            continue
+        column = df[name]
+        if pd.api.types.is_bool_dtype(column):
+            continue
+        if pd.api.types.is_integer_dtype(column):
+            df[name] = pd.to_numeric(column, downcast="integer")
+        elif pd.api.types.is_float_dtype(column):
+            downcast = column.astype(np.float32)
+            if np.array_equal(
+                downcast.to_numpy(np.float64), column.to_numpy(), equal_nan=True
+            ):
+                df[name] = downcast
+        elif pd.api.types.infer_dtype(column, skipna=True) == "string":
+            if name == trajectory_id_field or column.nunique() < len(column) // 2:
+                df[name] = column.astype("category")
+    return df
+
+
+def tc_from_pt_layer(
+    layer, time_field_name, trajectory_id_field, min_length=0, field_names=None
+):
+    df = df_from_pt_layer(layer, time_field_name, trajectory_id_field, field_names)
+    crs = pyproj_crs_from_layer(layer)
     return tc_from_df(df, time_field_name, trajectory_id_field, crs, min_length)
 
 
+def pyproj_crs_from_layer(layer):
+    return CRS(int(layer.sourceCrs().authid().split(":")[1]))
+
+
+def shapely_from_qgis(geometry):
+    """Convert a QgsGeometry to a shapely geometry, None if it is null
+
+    Geometries are exchanged as WKB, which is exact and much faster to
+    parse than WKT for polygons with many vertices.
+    """
+    if geometry.isNull():
+        return None
+    return shapely.from_wkb(bytes(geometry.asWkb()))
+
+
+def qgis_from_shapely(geometry):
+    """Convert a shapely geometry to a QgsGeometry via WKB"""
+    qgs_geometry = QgsGeometry()
+    qgs_geometry.fromWkb(shapely.to_wkb(geometry))
+    return qgs_geometry
+
+
+def shapely_from_source(source):
+    """Read all geometries and attributes of a layer or feature source
+
+    The WKB of all geometries is parsed in one call. Returns an array of
+    shapely geometries, None for features without geometry, and a list with
+    a dict of attribute values per feature.
+    """
+    field_names = source.fields().names()
+    wkbs, properties = [], []
+    for feature in source.getFeatures():
+        geometry = feature.geometry()
+        wkbs.append(None if geometry.isNull() else bytes(geometry.asWkb()))
+        properties.append(dict(zip(field_names, feature.attributes())))
+    return shapely.from_wkb(wkbs), properties
+
+
 def tc_from_df(df, time_field_name, trajectory_id_field, crs, min_length=0):
     df.drop(
         columns=["geometry"], inplace=True, errors="ignore"
@@ -135,17 +669,93 @@ def tc_from_df(df, time_field_name, trajectory_id_field, crs, min_length=0):
     return tc
 
 
-def feature_from_gdf_row(row):
-    f = QgsFeature()
-    f.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(row.geometry.x, row.geometry.y)))
-    values = row.values.tolist()[:-1]
-    for i, value in enumerate(values):
-        if isinstance(value, datetime):
-            values[i] = QDateTime(value)
-    # for v in values:
-    #    QgsMessageLog.logMessage(str(type(v)), "Trajectools", level=Qgis.Info )
-    f.setAttributes(values)
-    return f
+def linestringm_from_traj(traj):
+    """Build a LineStringM geometry from the trajectory's coordinate arrays
+
+    M values are seconds since the Unix epoch, as in to_linestringm_wkt(),
+    but no WKT string is formatted and parsed.
+    """
+    xs, ys = traj_xy(traj)
+    ms = (traj.df.index - UNIX_EPOCH) / pd.Timedelta(seconds=1)
+    line = QgsLineString(
+        xs.tolist(), ys.tolist(), [], np.asarray(ms, dtype=float).tolist()
+    )
+    return QgsGeometry(line)
+
+
+def traj_summaries(trajs, length_units, attr_mean_to_add=[], attr_first_to_add=[]):
+    """Compute the line layer attributes of all trajectories in one pass
+
+    The points of all trajectories are stacked into flat arrays and every
+    attribute is computed with a single grouped operation. Returns a list of
+    Series with one value per trajectory: start time, end time, duration in
+    seconds and length, followed by the mean of each attr_mean_to_add column
+    and the first value of each attr_first_to_add column. Numeric first values
+    are returned as floats.
+    """
+    sizes = np.array([len(traj.df) for traj in trajs], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    ends = starts + sizes - 1
+    codes = np.repeat(np.arange(len(trajs)), sizes)
+    times = pd.Series(np.concatenate([traj.df.index.values for traj in trajs]))
+    coords = [traj_xy(traj) for traj in trajs]
+    xs = np.concatenate([x for x, _ in coords])
+    ys = np.concatenate([y for _, y in coords])
+
+    lengths = group_lengths(xs, ys, codes, len(trajs), trajs[0].is_latlon)
+    conversion = get_conversion(length_units, trajs[0].crs_units)
+
+    start_times = times.iloc[starts].reset_index(drop=True)
+    end_times = times.iloc[ends].reset_index(drop=True)
+    summaries = [
+        start_times,
+        end_times,
+        (end_times - start_times).dt.total_seconds(),
+        pd.Series(lengths / conversion.distance),
+    ]
+    for a in attr_mean_to_add:
+        values = pd.concat([traj.df[a] for traj in trajs], ignore_index=True)
+        values = pd.to_numeric(values, errors="coerce")
+        summaries.append(values.groupby(codes).mean().reset_index(drop=True))
+    for a in attr_first_to_add:
+        values = pd.concat([traj.df[a] for traj in trajs], ignore_index=True)
+        first = values.iloc[starts].reset_index(drop=True)
+        if pd.api.types.is_numeric_dtype(first) or pd.api.types.is_bool_dtype(first):
+            first = first.astype(float)
+        summaries.append(first)
+    return summaries
+
+
+def qgis_values(column):
+    """Convert a column to a list of values that QGIS can store as attributes
+
+    Missing values become None (NULL) and datetimes become QDateTime.
+    """
+    values = column.astype(object).where(column.notna(), None)
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return [None if v is None else QDateTime(v) for v in values]
+    return values.tolist()
+
+
+def features_from_gdf(gdf, names, batch_size=FEATURE_BATCH_SIZE):
+    """Yield lists of up to batch_size point features built from gdf
+
+    Attribute values are taken from the columns in names and converted one
+    column at a time rather than row by row.
+    """
+    for start in range(0, len(gdf), batch_size):
+        block = gdf.iloc[start : start + batch_size]
+        columns = [qgis_values(block[name]) for name in names]
+        rows = zip(*columns) if columns else [()] * len(block)
+        xs = block.geometry.x.tolist()
+        ys = block.geometry.y.tolist()
+        features = []
+        for x, y, attrs in zip(xs, ys, rows):
+            f = QgsFeature()
+            f.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            f.setAttributes(list(attrs))
+            features.append(f)
+        yield features
 
 
 def feature_from_df_row(row):
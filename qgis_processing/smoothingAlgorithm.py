@@ -11,6 +11,7 @@ from .trajectoriesAlgorithm import (
     help_str_base,
     help_str_traj,
 )
+from .workerPool import apply_in_pool
 
 
 class SmoothingAlgorithm(TrajectoryManipulationAlgorithm):
@@ -74,9 +75,15 @@ class KalmanSmootherAlgorithm(SmoothingAlgorithm):
     def processTc(self, tc, parameters, context):
         pn = self.parameterAsDouble(parameters, self.PROCESS_NOISE, context)
         mn = self.parameterAsDouble(parameters, self.MEASURE_NOISE, context)
-        smooth = KalmanSmootherCV(tc).smooth(
-            process_noise_std=pn, measurement_noise_std=mn
+        smooth = apply_in_pool(
+            KalmanSmootherCV,
+            "smooth",
+            tc,
+            self.cpu_count,
+            self.task_size,
+            pool_size=self.pool_size,
+            process_noise_std=pn,
+            measurement_noise_std=mn,
         )
         self.tc_to_sink(smooth)
-        for traj in smooth:
-            self.traj_to_sink(traj)
+        self.trajs_to_sink(smooth)
@@ -0,0 +1,163 @@
+from copy import copy
+
+import numpy as np
+import shapely
+
+from movingpandas import TrajectoryCollection
+
+from .trajectoryKernels import (
+    point_arrays,
+    point_layout,
+    traj_xy,
+    trajectories_from_arrays,
+    trajectories_from_rows,
+    trajectory_rows,
+)
+from .workerPool import imap_shared, weighted_task_parts
+
+
+def trajectory_lines(trajs):
+    """Return the LineString of each trajectory, built from its coordinates"""
+    if not trajs:
+        return np.empty(0, dtype=object)
+    coords = [traj_xy(traj) for traj in trajs]
+    xs = np.concatenate([x for x, _ in coords])
+    ys = np.concatenate([y for _, y in coords])
+    indices = np.repeat(np.arange(len(trajs)), [len(x) for x, _ in coords])
+    return shapely.linestrings(xs, ys, indices=indices)
+
+
+class TrajectoryIndex:
+    """STRtree over the lines of a list of trajectories"""
+
+    def __init__(self, trajs):
+        self.trajs = trajs
+        self.tree = shapely.STRtree(trajectory_lines(trajs))
+
+    def query(self, geometries, owners=None):
+        """Return the positions of the trajectories intersecting each geometry
+
+        All geometries are joined with the trajectories in one bulk query,
+        which compares bounding boxes first and then tests the remaining
+        pairs with prepared geometries. If the geometries are parts, e.g.
+        tiles, of other geometries, owners holds the position of the geometry
+        each part belongs to. Returns a list of (geometry position,
+        trajectory positions) for the geometries that intersect any
+        trajectory, in geometry and trajectory order.
+        """
+        pairs = self.tree.query(
+            np.asarray(geometries, dtype=object), predicate="intersects"
+        )
+        if owners is not None:
+            pairs[0] = np.asarray(owners)[pairs[0]]
+        n_trajs = max(len(self.trajs), 1)
+        positions, trajs = np.divmod(np.unique(pairs[0] * n_trajs + pairs[1]), n_trajs)
+        positions, starts = np.unique(positions, return_index=True)
+        return list(zip(positions, np.split(trajs, starts[1:])))
+
+
+def clip_trajectories(trajs, polygon, min_length=0):
+    """Clip trajectories by polygon, dropping segments shorter than min_length"""
+    tc = TrajectoryCollection(trajs)  # trajs are already long enough
+    tc.min_length = min_length  # applied to the clipped segments
+    return tc.clip(polygon).trajectories
+
+
+def _clip(tasks, min_length):
+    return [
+        (i, clip_trajectories(trajs, polygon, min_length))
+        for i, polygon, trajs in tasks
+    ]
+
+
+def _clip_shared(arrays, tasks, ids, layout, min_length):
+    positions = sorted(ids)
+    trajs = trajectories_from_arrays(
+        arrays, positions, [ids[j] for j in positions], layout
+    )
+    trajs = dict(zip(positions, trajs))
+    return [
+        (
+            i,
+            trajectory_rows(
+                clip_trajectories([trajs[j] for j in group], polygon, min_length)
+            ),
+        )
+        for i, polygon, group in tasks
+    ]
+
+
+def iter_clip_parts(
+    tc, polygons, n_processes, task_size=None, tiles=None, pool_size=None
+):
+    """Yield lists of (polygon position, clipped trajectories), in polygon order
+
+    Each polygon is only clipped with the trajectories it intersects, which
+    are looked up with the polygons or, if given, with their (tiles, owners).
+    Polygons are grouped into tasks by their number of intersecting
+    trajectories, which run in the worker pool if n_processes > 1. The
+    workers get the points of the trajectories through shared memory, see
+    map_trajectories_in_pool().
+    """
+    trajs = tc.trajectories
+    index = TrajectoryIndex(trajs)
+    matches = index.query(*tiles) if tiles is not None else index.query(polygons)
+    tasks = [(i, polygons[i], group) for i, group in matches]
+    weights = [len(group) for _, _, group in tasks]
+    parts = weighted_task_parts(tasks, weights, n_processes, task_size)
+    if n_processes < 2:
+        for part in parts:
+            part = [
+                (i, polygon, [trajs[j] for j in group]) for i, polygon, group in part
+            ]
+            yield _clip(part, tc.min_length)
+        return
+    if not parts:
+        return
+    arrays = point_arrays(trajs)
+    layout = point_layout(trajs[0])
+    shared_tasks = [
+        (
+            part,
+            {j: trajs[j].id for _, _, group in part for j in group},
+            layout,
+            tc.min_length,
+        )
+        for part in parts
+    ]
+    for part in imap_shared(_clip_shared, arrays, shared_tasks, n_processes, pool_size):
+        yield [
+            (i, trajectories_from_rows(trajs, arrays["offsets"], rows))
+            for i, rows in part
+        ]
+
+
+def _batch(tc, trajs):
+    result = copy(tc)
+    result.trajectories = trajs
+    return result
+
+
+def iter_clips(tc, polygons, n_processes, task_size=None, tiles=None, pool_size=None):
+    """Yield batches of tc clipped by each polygon, in polygon order"""
+    for part in iter_clip_parts(tc, polygons, n_processes, task_size, tiles, pool_size):
+        yield _batch(tc, [traj for _, trajs in part for traj in trajs])
+
+
+def iter_intersections(
+    tc, polygons, properties, n_processes, task_size=None, tiles=None, pool_size=None
+):
+    """Yield batches of tc intersected with each polygon, in polygon order
+
+    Like TrajectoryCollection.intersection(), the properties of the polygon,
+    a dict per polygon, are added to each segment as intersecting_<name>
+    columns. They are only added here, so the workers never receive them.
+    """
+    for part in iter_clip_parts(tc, polygons, n_processes, task_size, tiles, pool_size):
+        batch = []
+        for i, trajs in part:
+            for traj in trajs:
+                for key, value in properties[i].items():
+                    traj.df["intersecting_" + key] = value
+            batch.extend(trajs)
+        yield _batch(tc, batch)
@@ -2,9 +2,7 @@ import pandas as pd
 
 from movingpandas import (
     TemporalSplitter,
-    ObservationGapSplitter,
     StopSplitter,
-    ValueChangeSplitter,
 )
 
 from qgis.core import (
@@ -19,6 +17,12 @@ from .trajectoriesAlgorithm import (
     help_str_base,
     help_str_traj,
 )
+from .trajectoryKernels import (
+    split_table_at_gaps,
+    split_table_at_value_changes,
+    trajectories_from_table,
+)
+from .workerPool import split_in_pool
 
 
 class SplitTrajectoriesAlgorithm(TrajectoryManipulationAlgorithm):
@@ -88,19 +92,12 @@ class ObservationGapSplitterAlgorithm(SplitTrajectoriesAlgorithm):
             td_units = "W"
         time_gap = pd.Timedelta(f"{time_gap} {td_units}").to_pytimedelta()
 
-        for traj in tc.trajectories:
-            try:
-                splits = ObservationGapSplitter(traj).split(
-                    gap=time_gap, min_length=tc.min_length, n_processes=self.cpu_count
-                )
-            except TypeError:
-                raise TypeError(
-                    "TypeError: cannot pickle 'QVariant' object. This error is usually caused by None values in input layer fields. Try to remove None values or run without Add movement metrics."  # noqa E501
-                )
-
-            self.tc_to_sink(splits)
-            for split in splits:
-                self.traj_to_sink(split)
+        table, ids, offsets = split_table_at_gaps(tc, time_gap)
+        self.pt_table_to_sink(table)
+        if self.output_trajs:
+            self.trajs_to_sink(
+                trajectories_from_table(table, ids, offsets, tc.trajectories[0])
+            )
 
 
 class TemporalSplitterAlgorithm(SplitTrajectoriesAlgorithm):
@@ -145,17 +142,17 @@ class TemporalSplitterAlgorithm(SplitTrajectoriesAlgorithm):
     def processTc(self, tc, parameters, context):
         split_mode = self.parameterAsInt(parameters, self.SPLIT_MODE, context)
         split_mode = self.SPLIT_MODE_OPTIONS[split_mode]
-        try:
-            splits = TemporalSplitter(tc).split(
-                mode=split_mode, min_length=tc.min_length, n_processes=self.cpu_count
-            )
-        except TypeError:
-            raise TypeError(
-                "TypeError: cannot pickle 'QVariant' object. This error is usually caused by None values in input layer fields. Try to remove None values or run without Add movement metrics."  # noqa E501
-            )
+        splits = split_in_pool(
+            TemporalSplitter,
+            tc,
+            self.cpu_count,
+            self.task_size,
+            pool_size=self.pool_size,
+            mode=split_mode,
+            min_length=tc.min_length,
+        )
         self.tc_to_sink(splits)
-        for split in splits:
-            self.traj_to_sink(split)
+        self.trajs_to_sink(splits)
 
 
 class StopSplitterAlgorithm(SplitTrajectoriesAlgorithm):
@@ -205,21 +202,19 @@ class StopSplitterAlgorithm(SplitTrajectoriesAlgorithm):
         max_diameter = self.parameterAsDouble(parameters, self.MAX_DIAMETER, context)
         min_duration = self.parameterAsString(parameters, self.MIN_DURATION, context)
         min_duration = pd.Timedelta(min_duration).to_pytimedelta()
-        try:
-            splits = StopSplitter(tc).split(
-                max_diameter=max_diameter,
-                min_duration=min_duration,
-                min_length=tc.min_length,
-                n_processes=self.cpu_count,
-            )
-        except TypeError:
-            raise TypeError(
-                "TypeError: cannot pickle 'QVariant' object. This error is usually caused by None values in input layer fields. Try to remove None values or run without Add movement metrics."  # noqa E501
-            )
+        splits = split_in_pool(
+            StopSplitter,
+            tc,
+            self.cpu_count,
+            self.task_size,
+            pool_size=self.pool_size,
+            max_diameter=max_diameter,
+            min_duration=min_duration,
+            min_length=tc.min_length,
+        )
 
         self.tc_to_sink(splits)
-        for split in splits:
-            self.traj_to_sink(split)
+        self.trajs_to_sink(splits)
 
 
 class ValueChangeSplitterAlgorithm(SplitTrajectoriesAlgorithm):
@@ -256,20 +251,17 @@ class ValueChangeSplitterAlgorithm(SplitTrajectoriesAlgorithm):
             "" + help_str_base + help_str_traj
         )
 
+    def get_input_field_names(self, parameters, context):
+        names = super().get_input_field_names(parameters, context)
+        if names is not None:
+            names = names + self.parameterAsStrings(parameters, self.FIELD, context)
+        return names
+
     def processTc(self, tc, parameters, context):
         self.field = self.parameterAsStrings(parameters, self.FIELD, context)[0]
-        for traj in tc.trajectories:
-            try:
-                splits = ValueChangeSplitter(traj).split(
-                    col_name=self.field,
-                    min_length=tc.min_length,
-                    n_processes=self.cpu_count,
-                )
-            except TypeError:
-                raise TypeError(
-                    "TypeError: cannot pickle 'QVariant' object. This error is usually caused by None values in input layer fields. Try to remove None values or run without Add movement metrics."  # noqa E501
-                )
-
-            self.tc_to_sink(splits)
-            for split in splits:
-                self.traj_to_sink(split)
+        table, ids, offsets = split_table_at_value_changes(tc, self.field)
+        self.pt_table_to_sink(table)
+        if self.output_trajs:
+            self.trajs_to_sink(
+                trajectories_from_table(table, ids, offsets, tc.trajectories[0])
+            )
@@ -2,6 +2,7 @@ import os
 
 from qgis.PyQt.QtGui import QIcon
 from qgis.core import Qgis, QgsProcessingProvider, QgsMessageLog
+from processing.core.ProcessingConfig import ProcessingConfig, Setting
 
 from .createTrajectoriesAlgorithm import CreateTrajectoriesAlgorithm
 from .splitTrajectoriesAlgorithm import (
@@ -28,6 +29,9 @@ from .generalizationAlgorithm import (
 from .cleaningAlgorithm import (
     OutlierCleanerAlgorithm,
 )
+from .qgisUtils import set_multiprocess_path
+from .overlayCache import clear_overlay_cache
+from .workerPool import WORKER_POOL_SIZE, shutdown_worker_pool
 
 try:  # skmob-based algs
     from .privacyAttackAlgorithm import HomeWorkAttack
@@ -67,11 +71,26 @@ class TrajectoolsProvider(QgsProcessingProvider):
         return QIcon(os.path.join(pluginPath, "icons", "icon.png"))
 
     def load(self):
+        ProcessingConfig.settingIcons[self.name()] = self.icon()
+        ProcessingConfig.addSetting(
+            Setting(
+                self.name(),
+                WORKER_POOL_SIZE,
+                "Maximum worker processes for parallel processing "
+                "(0 = number of CPUs)",
+                0,
+                valuetype=Setting.INT,
+            )
+        )
+        ProcessingConfig.readSettings()
+        set_multiprocess_path()
         self.refreshAlgorithms()
         return True
 
     def unload(self):
-        pass
+        ProcessingConfig.removeSetting(WORKER_POOL_SIZE)
+        shutdown_worker_pool()
+        clear_overlay_cache()
 
     def isActive(self):
         return True
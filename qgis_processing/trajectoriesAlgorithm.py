@@ -1,31 +1,44 @@
 import os
 
-from qgis.PyQt.QtCore import QCoreApplication, QMetaType, QDateTime
+from qgis.PyQt.QtCore import QCoreApplication, QMetaType
 from qgis.PyQt.QtGui import QIcon
 from qgis.core import (
     QgsProcessing,
     QgsProcessingAlgorithm,
     QgsProcessingParameterFeatureSink,
     QgsProcessingParameterFeatureSource,
+    QgsProcessingFeatureSourceDefinition,
+    QgsProcessingOutputLayerDefinition,
     QgsProcessingParameterField,
     QgsProcessingUtils,
     QgsWkbTypes,
     QgsProcessingParameterString,
     QgsProcessingParameterNumber,
     QgsProcessingParameterBoolean,
+    QgsProcessingParameterDefinition,
+    QgsProcessingParameterExtent,
+    QgsProcessingParameterDateTime,
     QgsField,
     QgsFields,
     QgsFeature,
-    QgsGeometry,
     QgsFeatureSink,
 )
 
 from .qgisUtils import (
-    set_multiprocess_path,
-    tc_from_pt_layer,
-    feature_from_gdf_row,
+    tc_from_df,
+    features_from_gdf,
+    linestringm_from_traj,
+    traj_summaries,
+    qgis_values,
+    FEATURE_BATCH_SIZE,
     df_from_pt_layer,
+    df_chunks_from_pt_layer,
+    ogr_file_source,
+    pyproj_crs_from_layer,
+    compact_dtypes,
 )
+from .ingestionCache import cache_key, load_cached_df, store_cached_df
+from .workerPool import configured_pool_size, plan_workers, add_metrics_in_pool
 
 pluginPath = os.path.dirname(__file__)
 
@@ -44,6 +57,8 @@ help_str_base = (
     "<p><b>Timestamp field</b> is the input layer field the position time. "
     "Datetime fields are preferred but we will attempt to parse string fields "
     "using Pandas' built-in parser.</p>"
+    "<p>The advanced <b>Only read input points ...</b> settings restrict the "
+    "input points to an extent and/or time window while the layer is read.</p>"
 )
 help_str_traj = (
     "<p><b>Minimum trajectory length</b> is the desired minimum length of output "
@@ -64,12 +79,19 @@ class TrajectoriesAlgorithm(QgsProcessingAlgorithm):
     TIMESTAMP_FIELD = "TIME_FIELD"
     ADD_METRICS = "ADD_METRICS"
     USE_PARALLEL_PROCESSING = "USE_PARALLEL_PROCESSING"
+    WORKERS = "WORKERS"
+    TASK_SIZE = "TASK_SIZE"
+    WORKER_MEMORY = "WORKER_MEMORY"
     SPEED_UNIT = "SPEED_UNIT"
     MIN_LENGTH = "MIN_LENGTH"
+    USE_CACHE = "USE_CACHE"
+    COMPACT_DTYPES = "COMPACT_DTYPES"
+    FILTER_EXTENT = "FILTER_EXTENT"
+    FILTER_START_TIME = "FILTER_START_TIME"
+    FILTER_END_TIME = "FILTER_END_TIME"
 
     def __init__(self):
         super().__init__()
-        set_multiprocess_path()
 
     def icon(self):
         return QIcon(os.path.join(pluginPath, "icons", "mpd.png"))
@@ -83,9 +105,10 @@ class TrajectoriesAlgorithm(QgsProcessingAlgorithm):
     def createInstance(self):
         return type(self)()
 
-    def flags(self):
-        super().flags()
-        return QgsProcessingAlgorithm.FlagNoThreading
+    def prepareAlgorithm(self, parameters, context, feedback):
+        # runs in the main thread, so the input layer can be inspected here
+        self.prepare_parameters(parameters, context)
+        return True
 
     def initAlgorithm(self, config=None):
         self.addParameter(
@@ -117,17 +140,115 @@ class TrajectoriesAlgorithm(QgsProcessingAlgorithm):
                 optional=False,
             )
         )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                name=self.USE_PARALLEL_PROCESSING,
+                description=self.tr("Use parallel processing (experimental)"),
+                defaultValue=False,
+                optional=False,
+            )
+        )
+        param = QgsProcessingParameterBoolean(
+            name=self.USE_CACHE,
+            description=self.tr("Cache parsed input points on disk"),
+            defaultValue=False,
+            optional=True,
+        )
+        param.setFlags(param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(param)
+        param = QgsProcessingParameterBoolean(
+            name=self.COMPACT_DTYPES,
+            description=self.tr("Use compact data types to reduce memory use"),
+            defaultValue=False,
+            optional=True,
+        )
+        param.setFlags(param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(param)
+        for param in [
+            QgsProcessingParameterExtent(
+                name=self.FILTER_EXTENT,
+                description=self.tr("Only read input points within extent"),
+                optional=True,
+            ),
+            QgsProcessingParameterDateTime(
+                name=self.FILTER_START_TIME,
+                description=self.tr("Only read input points after"),
+                optional=True,
+            ),
+            QgsProcessingParameterDateTime(
+                name=self.FILTER_END_TIME,
+                description=self.tr("Only read input points before"),
+                optional=True,
+            ),
+        ]:
+            param.setFlags(
+                param.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+            )
+            self.addParameter(param)
+        for name, description in [
+            (
+                self.WORKERS,
+                self.tr(
+                    "Number of parallel worker processes "
+                    "(0 = auto, at most the worker processes set in the options)"
+                ),
+            ),
+            (self.TASK_SIZE, self.tr("Trajectories per parallel task (0 = auto)")),
+            (self.WORKER_MEMORY, self.tr("Memory budget per worker in MB (0 = auto)")),
+        ]:
+            param = QgsProcessingParameterNumber(
+                name=name,
+                description=description,
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=0,
+                minValue=0,
+                optional=True,
+            )
+            param.setFlags(
+                param.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+            )
+            self.addParameter(param)
 
     def create_df(self, parameters, context):
-        self.prepare_parameters(parameters, context)
+        return self.read_pt_df()
+
+    def read_pt_df(self):
+        key = self.input_cache_key
+        if key is not None:
+            df = load_cached_df(key)
+            if df is not None:
+                return self.compact(df)
 
         df = df_from_pt_layer(
-            self.input_layer, self.timestamp_field, self.traj_id_field
+            self.input_layer,
+            self.timestamp_field,
+            self.traj_id_field,
+            self.input_field_names,
+            extent=self.filter_extent,
+            start_time=self.filter_start_time,
+            end_time=self.filter_end_time,
+            file_source=self.input_file_source,
         )
 
+        if key is not None:
+            sort_cols = [c for c in [self.traj_id_field] if c in df.columns]
+            df.sort_values(sort_cols + [self.timestamp_field], inplace=True)
+            df.reset_index(drop=True, inplace=True)
+            store_cached_df(key, df)
+        return self.compact(df)
+
+    def compact(self, df):
+        if self.compact_dtypes:
+            compact_dtypes(df, self.traj_id_field)
         return df
 
     def prepare_parameters(self, parameters, context):
+        """Read the parameters into attributes
+
+        Called from prepareAlgorithm in the main thread. QGIS creates a new
+        algorithm instance for each execution, so these attributes are the
+        state of a single run.
+        """
         self.input_layer = self.parameterAsSource(parameters, self.INPUT, context)
         self.traj_id_field = self.parameterAsStrings(
             parameters, self.TRAJ_ID_FIELD, context
@@ -145,46 +266,145 @@ class TrajectoriesAlgorithm(QgsProcessingAlgorithm):
         self.use_parallel = self.parameterAsBoolean(
             parameters, self.USE_PARALLEL_PROCESSING, context
         )
+        self.use_cache = self.parameterAsBoolean(parameters, self.USE_CACHE, context)
+        self.compact_dtypes = self.parameterAsBoolean(
+            parameters, self.COMPACT_DTYPES, context
+        )
+        self.workers = self.parameterAsInt(parameters, self.WORKERS, context)
+        self.trajs_per_task = self.parameterAsInt(parameters, self.TASK_SIZE, context)
+        self.task_size = self.trajs_per_task or None
+        self.worker_memory = self.parameterAsInt(
+            parameters, self.WORKER_MEMORY, context
+        )
+        self.pool_size = 1
         if self.use_parallel:
-            self.cpu_count = os.cpu_count()
-        else:
-            self.cpu_count = 1
+            # the pool setting, read here in the main thread, is the upper
+            # bound of the number of workers
+            self.pool_size = configured_pool_size()
+            if self.workers:
+                self.pool_size = min(self.workers, self.pool_size)
+        self.cpu_count = self.pool_size
+        self.input_field_names = self.get_input_field_names(parameters, context)
+        self.filter_extent = None
+        if parameters.get(self.FILTER_EXTENT):
+            self.filter_extent = self.parameterAsExtent(
+                parameters, self.FILTER_EXTENT, context, self.input_layer.sourceCrs()
+            )
+        self.filter_start_time = self.get_filter_time(
+            parameters, self.FILTER_START_TIME, context
+        )
+        self.filter_end_time = self.get_filter_time(
+            parameters, self.FILTER_END_TIME, context
+        )
+        layer = self.get_input_pt_layer(parameters, context)
+        self.input_file_source = ogr_file_source(layer)
+        self.input_cache_key = None
+        if self.use_cache:
+            self.input_cache_key = cache_key(
+                layer,
+                self.timestamp_field,
+                self.traj_id_field,
+                self.input_field_names,
+                filters=[
+                    self.filter_extent.toString() if self.filter_extent else None,
+                    str(self.filter_start_time),
+                    str(self.filter_end_time),
+                ],
+            )
+
+    def get_filter_time(self, parameters, name, context):
+        if not parameters.get(name):
+            return None
+        dt = self.parameterAsDateTime(parameters, name, context)
+        if not dt.isValid():
+            return None
+        return dt.toPyDateTime()
+
+    def get_input_pt_layer(self, parameters, context):
+        """Input vector layer, if its file may be read directly from disk
+
+        Returns None if only selected or filtered features are used. The layer
+        is only inspected in the main thread, the points are read from the
+        file or from the thread-safe input feature source.
+        """
+        return self.get_unfiltered_layer(parameters, self.INPUT, context)
+
+    def get_unfiltered_layer(self, parameters, name, context):
+        """Vector layer of a parameter, None if only some features are used"""
+        definition = parameters.get(name)
+        if isinstance(definition, QgsProcessingFeatureSourceDefinition) and (
+            definition.selectedFeaturesOnly
+            or definition.featureLimit >= 0
+            or getattr(definition, "filterExpression", "")
+        ):
+            return None
+        return self.parameterAsVectorLayer(parameters, name, context)
+
+    def get_input_field_names(self, parameters, context):
+        """Names of the input layer fields this algorithm reads
+
+        Returning None reads all fields. Algorithms that do not copy input
+        attributes to their outputs only need the trajectory ID and timestamp.
+        """
+        return [self.traj_id_field, self.timestamp_field]
 
     def create_tc(self, parameters, context):
-        self.prepare_parameters(parameters, context)
         crs = self.input_layer.sourceCrs()
 
-        tc = tc_from_pt_layer(
-            self.input_layer, self.timestamp_field, self.traj_id_field, self.min_length
-        )
+        df = self.read_pt_df()
+        tc = self.tc_from_pt_df(df)
 
         if len(tc.trajectories) < 1:
             raise ValueError(
                 "The resulting trajectory collection is empty. Check that the trajectory ID and timestamp fields have been configured correctly."  # noqa E501
             )
 
-        if self.add_metrics:
-            try:
-                tc.add_speed(
-                    units=tuple(self.speed_units),
-                    overwrite=True,
-                    n_processes=self.cpu_count,
-                )
-                tc.add_direction(overwrite=True, n_processes=self.cpu_count)
-            except (
-                TypeError
-            ):  # None values cause TypeError: cannot pickle 'QVariant' object, see issue #93   # noqa E501
-                raise TypeError(
-                    "TypeError: cannot pickle 'QVariant' object. This error is usually caused by None values in input layer fields. Try to remove None values or run without Add movement metrics."  # noqa E501
-                )
-
+        self.plan_workers(tc, df)
+        self.add_tc_metrics(tc)
         return tc, crs
 
+    def plan_workers(self, tc, df):
+        """Size the parallel run from the data, unless set explicitly"""
+        if not self.use_parallel:
+            return
+        self.cpu_count, self.task_size = plan_workers(
+            len(tc.trajectories),
+            df.memory_usage().sum(),
+            self.workers,
+            self.trajs_per_task,
+            self.worker_memory * 1024**2,
+            self.pool_size,
+        )
+
+    def tc_from_pt_df(self, df):
+        return tc_from_df(
+            df,
+            self.timestamp_field,
+            self.traj_id_field,
+            pyproj_crs_from_layer(self.input_layer),
+            self.min_length,
+        )
+
+    def add_tc_metrics(self, tc):
+        if self.add_metrics:
+            add_metrics_in_pool(
+                tc,
+                self.speed_units,
+                self.cpu_count,
+                self.task_size,
+                pool_size=self.pool_size,
+            )
+
     def get_pt_fields(self, fields_to_add=[]):
         fields = QgsFields()
         for field in self.input_layer.fields():
             if field.name() == "fid":
                 continue
+            elif (
+                self.input_field_names is not None
+                and field.name() not in self.input_field_names
+            ):
+                continue  # field was not read from the input layer
             elif field.name() == "geometry":
                 continue  # Fixes Error when attribute table contains geometry column #44  # noqa E501
             elif field.name() == self.traj_id_field:
@@ -206,6 +426,7 @@ class TrajectoryManipulationAlgorithm(TrajectoriesAlgorithm):
     OUTPUT_PTS = "OUTPUT_PTS"
     OUTPUT_SEGS = "OUTPUT_SEGS"
     OUTPUT_TRAJS = "OUTPUT_TRAJS"
+    CHUNK_SIZE = "CHUNK_SIZE"
 
     def initAlgorithm(self, config=None):
         super().initAlgorithm(config)
@@ -214,6 +435,8 @@ class TrajectoryManipulationAlgorithm(TrajectoriesAlgorithm):
                 name=self.OUTPUT_PTS,
                 description=self.tr("Trajectory points"),
                 type=QgsProcessing.TypeVectorPoint,
+                optional=True,
+                createByDefault=True,
             )
         )
         self.addParameter(
@@ -221,6 +444,8 @@ class TrajectoryManipulationAlgorithm(TrajectoriesAlgorithm):
                 name=self.OUTPUT_TRAJS,
                 description=self.tr("Trajectories"),
                 type=QgsProcessing.TypeVectorLine,
+                optional=True,
+                createByDefault=True,
             )
         )
         self.addParameter(
@@ -241,14 +466,6 @@ class TrajectoryManipulationAlgorithm(TrajectoriesAlgorithm):
                 optional=False,
             )
         )
-        self.addParameter(
-            QgsProcessingParameterBoolean(
-                name=self.USE_PARALLEL_PROCESSING,
-                description=self.tr("Use parallel processing (experimental)"),
-                defaultValue=False,
-                optional=False,
-            )
-        )
         self.addParameter(
             QgsProcessingParameterString(
                 name=self.SPEED_UNIT,
@@ -266,14 +483,94 @@ class TrajectoryManipulationAlgorithm(TrajectoriesAlgorithm):
                 minValue=0,
             )
         )
+        param = QgsProcessingParameterNumber(
+            name=self.CHUNK_SIZE,
+            description=self.tr(
+                "Process input in chunks of this many points (0 = all at once, "
+                "requires input sorted by trajectory ID)"
+            ),
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=0,
+            minValue=0,
+            optional=True,
+        )
+        param.setFlags(param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(param)
+
+    def prepare_parameters(self, parameters, context):
+        self.output_pts = self.is_output_requested(parameters, self.OUTPUT_PTS)
+        self.output_trajs = self.is_output_requested(parameters, self.OUTPUT_TRAJS)
+        super().prepare_parameters(parameters, context)
+        # speed and direction are only written to the points output
+        self.add_metrics = self.add_metrics and self.output_pts
+
+    def is_output_requested(self, parameters, name):
+        value = parameters.get(name)
+        if isinstance(value, QgsProcessingOutputLayerDefinition):
+            value = value.sink.staticValue()
+        return value not in [None, ""]
+
+    def get_input_field_names(self, parameters, context):
+        if self.output_pts:
+            return None  # all input attributes are copied to the points output
+        return [self.traj_id_field, self.timestamp_field] + self.parameterAsStrings(
+            parameters, self.FIELDS_TO_ADD, context
+        )
 
     def processAlgorithm(self, parameters, context, feedback):
+        chunk_size = self.parameterAsInt(parameters, self.CHUNK_SIZE, context)
+        if chunk_size > 0:
+            return self.process_chunks(parameters, context, feedback, chunk_size)
         tc, crs = self.create_tc(parameters, context)
-        self.setup_pt_sink(parameters, context, tc, crs)
-        self.setup_traj_sink(parameters, context, crs)
+        self.setup_sinks(parameters, context, tc, crs)
         self.processTc(tc, parameters, context)
         return {self.OUTPUT_PTS: self.dest_pts, self.OUTPUT_TRAJS: self.dest_trajs}
 
+    def process_chunks(self, parameters, context, feedback, chunk_size):
+        """Read, process and write the input a few whole trajectories at a time
+
+        Peak memory depends on chunk_size instead of the input size. The input
+        layer has to be sorted by trajectory ID.
+        """
+        crs = self.input_layer.sourceCrs()
+        chunks = df_chunks_from_pt_layer(
+            self.input_layer,
+            self.timestamp_field,
+            self.traj_id_field,
+            self.input_field_names,
+            chunk_size,
+            extent=self.filter_extent,
+            start_time=self.filter_start_time,
+            end_time=self.filter_end_time,
+        )
+        sinks_ready = False
+        for df in chunks:
+            if feedback.isCanceled():
+                break
+            tc = self.tc_from_pt_df(self.compact(df))
+            if len(tc.trajectories) < 1:
+                continue
+            self.plan_workers(tc, df)
+            self.add_tc_metrics(tc)
+            if not sinks_ready:
+                self.setup_sinks(parameters, context, tc, crs)
+                sinks_ready = True
+            self.processTc(tc, parameters, context)
+        if not sinks_ready:
+            raise ValueError(
+                "The resulting trajectory collection is empty. Check that the trajectory ID and timestamp fields have been configured correctly."  # noqa E501
+            )
+        return {self.OUTPUT_PTS: self.dest_pts, self.OUTPUT_TRAJS: self.dest_trajs}
+
+    def setup_sinks(self, parameters, context, tc, crs):
+        """Create the requested output sinks, skipped outputs are set to None"""
+        self.sink_pts, self.dest_pts = None, None
+        self.sink_trajs, self.dest_trajs = None, None
+        if self.output_pts:
+            self.setup_pt_sink(parameters, context, tc, crs)
+        if self.output_trajs:
+            self.setup_traj_sink(parameters, context, crs)
+
     def setup_traj_sink(self, parameters, context, crs):
         self.fields_to_add = self.parameterAsStrings(
             parameters, self.FIELDS_TO_ADD, context
@@ -309,11 +606,12 @@ class TrajectoryManipulationAlgorithm(TrajectoriesAlgorithm):
         pass  # needs to be implemented by each splitter
 
     def postProcessAlgorithm(self, context, feedback):
-        if self.add_metrics:
+        if self.add_metrics and self.dest_pts:
             pts_layer = QgsProcessingUtils.mapLayerFromString(self.dest_pts, context)
             pts_layer.loadNamedStyle(os.path.join(pluginPath, "styles", "pts.qml"))
-        traj_layer = QgsProcessingUtils.mapLayerFromString(self.dest_trajs, context)
-        traj_layer.loadNamedStyle(os.path.join(pluginPath, "styles", "traj.qml"))
+        if self.dest_trajs:
+            traj_layer = QgsProcessingUtils.mapLayerFromString(self.dest_trajs, context)
+            traj_layer.loadNamedStyle(os.path.join(pluginPath, "styles", "traj.qml"))
         return {self.OUTPUT_PTS: self.dest_pts, self.OUTPUT_TRAJS: self.dest_trajs}
 
     def get_traj_fields(self, fields_to_add=[]):
@@ -336,46 +634,59 @@ class TrajectoryManipulationAlgorithm(TrajectoriesAlgorithm):
         return fields
 
     def traj_to_sink(self, traj, attr_mean_to_add=[], attr_first_to_add=[]):
-        line = QgsGeometry.fromWkt(traj.to_linestringm_wkt())
-        f = QgsFeature()
-        f.setGeometry(line)
-        start_time = QDateTime(traj.get_start_time())
-        end_time = QDateTime(traj.get_end_time())
-        duration = float(traj.get_duration().total_seconds())
-        length = traj.get_length(units=self.speed_units[0])
-        speed = length / (duration / TIME_FACTOR[self.speed_units[1]])
-        attrs = [traj.id, start_time, end_time, duration, length, speed]
+        self.trajs_to_sink([traj], attr_mean_to_add, attr_first_to_add)
+
+    def trajs_to_sink(self, trajs, attr_mean_to_add=[], attr_first_to_add=[]):
+        if self.sink_trajs is None:
+            return  # trajectories output was not requested
+        trajs = list(trajs)
+        if len(trajs) < 1:
+            return
         attr_first_to_add = self.fields_to_add + attr_first_to_add
-        for a in attr_mean_to_add:
-            attrs.append(float(traj.df[a].mean()))
-        for a in attr_first_to_add:
-            try:
-                attrs.append(float(traj.df[a].iloc[0]))
-                continue
-            except TypeError:
-                pass
-            try:
-                attrs.append(int(traj.df[a].iloc[0]))
-                continue
-            except TypeError:
-                pass
-            attrs.append(traj.df[a].iloc[0])
-        f.setAttributes(attrs)
-        self.sink_trajs.addFeature(f, QgsFeatureSink.FastInsert)
+        summaries = traj_summaries(
+            trajs, self.speed_units[0], attr_mean_to_add, attr_first_to_add
+        )
+        start_time, end_time, duration, length = summaries[:4]
+        speed = length / (duration / TIME_FACTOR[self.speed_units[1]])
+        columns = [
+            [traj.id for traj in trajs],
+            qgis_values(start_time),
+            qgis_values(end_time),
+            qgis_values(duration),
+            qgis_values(length),
+            qgis_values(speed),
+        ]
+        columns += [qgis_values(values) for values in summaries[4:]]
+
+        features = []
+        for traj, attrs in zip(trajs, zip(*columns)):
+            f = QgsFeature()
+            f.setGeometry(linestringm_from_traj(traj))
+            f.setAttributes(list(attrs))
+            features.append(f)
+            if len(features) >= FEATURE_BATCH_SIZE:
+                self.sink_trajs.addFeatures(features, QgsFeatureSink.FastInsert)
+                features = []
+        self.sink_trajs.addFeatures(features, QgsFeatureSink.FastInsert)
 
     def tc_to_sink(self, tc, field_names_to_add=[]):
+        if self.sink_pts is None:
+            return  # points output was not requested
         try:
             dfs = tc.to_point_gdf()
         except ValueError:  # when the tc is empty
             return
+        self.pt_table_to_sink(dfs, field_names_to_add)
+
+    def pt_table_to_sink(self, dfs, field_names_to_add=[]):
+        """Write a time indexed GeoDataFrame of trajectory points to the sink"""
+        if self.sink_pts is None:
+            return  # points output was not requested
         dfs[self.timestamp_field] = dfs.index
 
         names = [field.name() for field in self.fields_pts]
         for field_name in field_names_to_add:
             names.append(field_name)
-        names.append("geometry")
-        dfs = dfs[names]
 
-        for _, row in dfs.iterrows():
-            f = feature_from_gdf_row(row)
-            self.sink_pts.addFeature(f, QgsFeatureSink.FastInsert)
+        for features in features_from_gdf(dfs, names):
+            self.sink_pts.addFeatures(features, QgsFeatureSink.FastInsert)
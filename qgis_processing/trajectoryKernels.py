@@ -0,0 +1,287 @@
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Geod
+
+from movingpandas import Trajectory
+
+WGS84 = Geod(ellps="WGS84")  # same ellipsoid as MovingPandas' geodesic lengths
+ROW_COL = "__trajectools_row"  # source row of each point sent to the workers
+
+
+def traj_xy(traj):
+    """Return the x and y coordinate arrays of a trajectory
+
+    The point geometry column is only populated once MovingPandas needs it,
+    until then the coordinates are still in the x/y columns.
+    """
+    x, y = getattr(traj, "x", None), getattr(traj, "y", None)
+    if x in traj.df.columns and y in traj.df.columns:
+        return traj.df[x].to_numpy(dtype=float), traj.df[y].to_numpy(dtype=float)
+    geoms = traj.df[traj.get_geom_col()]
+    return geoms.x.to_numpy(), geoms.y.to_numpy()
+
+
+def trajectory_offsets(trajs):
+    """Return the first row of each trajectory and the total row count"""
+    return np.concatenate([[0], np.cumsum([len(traj.df) for traj in trajs])])
+
+
+def trajectory_times(trajs):
+    """Return the timestamps of all trajectories as int64 nanoseconds"""
+    if not trajs:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(
+        [traj.df.index.values.astype("datetime64[ns]").view(np.int64) for traj in trajs]
+    )
+
+
+def group_lengths(xs, ys, groups, n_groups, is_latlon):
+    """Return the length of the line through the points of each group
+
+    groups holds the group number of each point, in ascending order. Lengths
+    are in CRS units, or in metres on the WGS84 ellipsoid for geographic
+    coordinates, like MovingPandas' trajectory lengths.
+    """
+    if is_latlon:
+        _, _, dists = WGS84.inv(xs[:-1], ys[:-1], xs[1:], ys[1:])
+    else:
+        dists = np.hypot(np.diff(xs), np.diff(ys))
+    same = groups[1:] == groups[:-1]
+    return np.bincount(groups[1:][same], weights=dists[same], minlength=n_groups)
+
+
+def trajectory_value_codes(trajs, col_name):
+    """Return integer codes of a column of all trajectories, -1 for missing"""
+    if not trajs:
+        return np.empty(0, dtype=np.int64)
+    values = pd.concat([traj.df[col_name] for traj in trajs], ignore_index=True)
+    return pd.factorize(values)[0].astype(np.int64)
+
+
+def concat_ranges(first, n):
+    """Return the concatenated ranges [first, first + n) and their numbers"""
+    numbers = np.repeat(np.arange(len(n)), n)
+    shift = first - np.concatenate([[0], np.cumsum(n)[:-1]])
+    return np.repeat(shift, n) + np.arange(len(numbers)), numbers
+
+
+def split_table(tc, starts, overlap=False):
+    """Split the point table of tc at the rows where starts is True
+
+    starts must be True at the first row of each trajectory. With overlap,
+    each sub-trajectory also gets the first point of the next one of the
+    same trajectory, as in MovingPandas' ValueChangeSplitter. Single points
+    and sub-trajectories shorter than tc.min_length are dropped, using one
+    length computation for all of them.
+
+    Returns the point table of the sub-trajectories, with point geometries,
+    the sub-trajectory IDs, named <trajectory id>_<n> as in the MovingPandas
+    splitters, and the first row of each sub-trajectory plus the total row
+    count.
+    """
+    trajs = tc.trajectories
+    offsets = trajectory_offsets(trajs)
+    codes = np.repeat(np.arange(len(trajs)), np.diff(offsets))
+    first = np.flatnonzero(starts)
+    ends = np.append(first[1:], len(starts))
+    if overlap:
+        ends[:-1] += codes[ends[:-1]] == codes[first[:-1]]
+    sizes = ends - first
+    numbers = np.arange(len(first)) - np.searchsorted(codes[first], codes[first])
+
+    coords = [traj_xy(traj) for traj in trajs]
+    xs = np.concatenate([x for x, _ in coords])
+    ys = np.concatenate([y for _, y in coords])
+    keep = np.flatnonzero(sizes > 1)
+    if tc.min_length:
+        rows, groups = concat_ranges(first[keep], sizes[keep])
+        lengths = group_lengths(
+            xs[rows], ys[rows], groups, len(keep), trajs[0].is_latlon
+        )
+        keep = keep[lengths >= tc.min_length]
+    rows, _ = concat_ranges(first[keep], sizes[keep])
+
+    table = pd.concat([traj.df for traj in trajs]).iloc[rows]
+    template = trajs[0]
+    table.drop(columns=[template.x, template.y], inplace=True, errors="ignore")
+    table[template.get_geom_col()] = shapely.points(xs[rows], ys[rows])
+    ids = [
+        f"{trajs[code].id}_{n}" for code, n in zip(codes[first][keep], numbers[keep])
+    ]
+    table[template.get_traj_id_col()] = np.repeat(
+        np.array(ids, dtype=object), sizes[keep]
+    )
+    return table, ids, np.concatenate([[0], np.cumsum(sizes[keep])])
+
+
+def split_table_at_gaps(tc, gap):
+    """Split all trajectories of tc at observation gaps larger than gap
+
+    Works on the point table of the whole collection, which is already
+    ordered by trajectory and time: a new sub-trajectory starts wherever the
+    trajectory changes or the time difference to the previous point exceeds
+    gap. Returns the same as split_table().
+    """
+    trajs = tc.trajectories
+    codes = np.repeat(np.arange(len(trajs)), np.diff(trajectory_offsets(trajs)))
+    times = trajectory_times(trajs)
+    starts = np.ones(len(times), dtype=bool)
+    starts[1:] = (codes[1:] != codes[:-1]) | (np.diff(times) > pd.Timedelta(gap).value)
+    return split_table(tc, starts)
+
+
+def split_table_at_value_changes(tc, col_name):
+    """Split all trajectories of tc where the value of col_name changes
+
+    A new sub-trajectory starts wherever the trajectory or the value changes.
+    Missing values never equal the previous value, as in MovingPandas'
+    ValueChangeSplitter. Returns the same as split_table().
+    """
+    trajs = tc.trajectories
+    codes = np.repeat(np.arange(len(trajs)), np.diff(trajectory_offsets(trajs)))
+    values = trajectory_value_codes(trajs, col_name)
+    starts = np.ones(len(values), dtype=bool)
+    starts[1:] = (codes[1:] != codes[:-1]) | (values[1:] != values[:-1])
+    starts[values == -1] = True
+    return split_table(tc, starts, overlap=True)
+
+
+def trajectories_from_table(table, ids, offsets, template):
+    """Build the trajectories of a point table from their first rows
+
+    template is a trajectory the new ones take their ID column and CRS from.
+    """
+    return [
+        Trajectory(
+            table.iloc[offsets[i] : offsets[i + 1]],
+            traj_id,
+            traj_id_col=template.get_traj_id_col(),
+            crs=template.crs,
+        )
+        for i, traj_id in enumerate(ids)
+    ]
+
+
+def point_arrays(trajs):
+    """Return the coordinates, timestamps and first rows of trajectories
+
+    The arrays are all the worker processes need to rebuild the trajectories
+    with trajectories_from_arrays(), the other columns stay in this process.
+    """
+    coords = [traj_xy(traj) for traj in trajs]
+    return {
+        "x": np.concatenate([x for x, _ in coords]),
+        "y": np.concatenate([y for _, y in coords]),
+        "t": trajectory_times(trajs),
+        "offsets": trajectory_offsets(trajs),
+    }
+
+
+def point_layout(template):
+    """Return the ID column, CRS and time index of the trajectories of a run"""
+    return {
+        "traj_id_col": template.get_traj_id_col(),
+        "crs": template.crs,
+        "index_name": template.df.index.name,
+        "index_unit": template.df.index.unit,
+    }
+
+
+def trajectories_from_arrays(arrays, positions, ids, layout):
+    """Build the trajectories at positions from the arrays of point_arrays()
+
+    The trajectories only have x/y columns, the timestamps and a ROW_COL
+    column with the row of each point, for trajectory_rows(). The arrays are
+    copied, so they can be released while the trajectories are in use.
+    """
+    x, y, t, offsets = arrays["x"], arrays["y"], arrays["t"], arrays["offsets"]
+    trajs = []
+    for position, traj_id in zip(positions, ids):
+        start, end = offsets[position], offsets[position + 1]
+        index = pd.DatetimeIndex(
+            t[start:end].astype("datetime64[ns]"), name=layout["index_name"]
+        ).as_unit(layout["index_unit"])
+        df = pd.DataFrame(
+            {
+                "x": x[start:end].copy(),
+                "y": y[start:end].copy(),
+                ROW_COL: np.arange(start, end),
+            },
+            index=index,
+        )
+        trajs.append(
+            Trajectory(
+                df,
+                traj_id,
+                traj_id_col=layout["traj_id_col"],
+                x="x",
+                y="y",
+                crs=layout["crs"],
+            )
+        )
+    return trajs
+
+
+def trajectory_rows(trajs):
+    """Return the points of trajectories built by trajectories_from_arrays()
+
+    This is what trajectories_from_rows() needs to rebuild them, after
+    processing, with all columns: for each trajectory its ID, the source rows
+    of its points, their coordinates and time index, whether the coordinates
+    are still only in x/y columns and the columns the processing added.
+    """
+    rows = []
+    for traj in trajs:
+        x, y = traj_xy(traj)
+        lazy = getattr(traj, "x", None) in traj.df.columns
+        added = traj.df.columns.difference(
+            [ROW_COL, "x", "y", traj.get_geom_col(), traj.get_traj_id_col()]
+        )
+        rows.append(
+            (
+                traj.id,
+                traj.df[ROW_COL].to_numpy(dtype=np.int64),
+                x,
+                y,
+                traj.df.index,
+                lazy,
+                {col: traj.df[col].to_numpy() for col in added},
+            )
+        )
+    return rows
+
+
+def trajectories_from_rows(trajs, offsets, rows):
+    """Rebuild the trajectories of trajectory_rows() with the columns of trajs
+
+    offsets are the first rows of trajs, as in point_arrays(). Each point
+    gets the columns of its source row, which is the previous point for the
+    points MovingPandas interpolates, like its own processing does.
+    """
+    result = []
+    for traj_id, points, xs, ys, index, lazy, added in rows:
+        position = np.searchsorted(offsets, points[0], side="right") - 1
+        source = trajs[position]
+        df = source.df.iloc[points - offsets[position]].copy()
+        x, y = getattr(source, "x", None), getattr(source, "y", None)
+        if lazy and x in df.columns and y in df.columns:
+            df[x], df[y] = xs, ys
+        else:
+            df.drop(columns=[x, y], inplace=True, errors="ignore")
+            df[source.get_geom_col()] = shapely.points(xs, ys)
+            x = y = None
+        for col, values in added.items():
+            df[col] = values
+        df.index = index
+        result.append(
+            Trajectory(
+                df,
+                traj_id,
+                traj_id_col=source.get_traj_id_col(),
+                x=x,
+                y=y,
+                crs=source.crs,
+            )
+        )
+    return result
@@ -0,0 +1,411 @@
+import os
+import math
+import atexit
+import threading
+import multiprocessing
+from collections import deque
+from copy import copy
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from movingpandas import TrajectoryCollection, TrajectoryStopDetector
+
+from .trajectoryKernels import (
+    point_arrays,
+    point_layout,
+    trajectories_from_arrays,
+    trajectories_from_rows,
+    trajectory_offsets,
+    trajectory_rows,
+)
+
+try:  # optional, used to size the pool from the available memory
+    import psutil
+except ImportError:
+    psutil = None
+
+WORKER_POOL_SIZE = "TRAJECTOOLS_WORKER_POOL_SIZE"  # Processing setting name
+TASKS_PER_WORKER = 4  # default number of tasks per worker, for load balancing
+WORKER_MEMORY_FACTOR = 4  # worker memory use relative to the data it gets
+
+_pool = None
+_pool_size = None
+_pool_users = 0
+_pool_lock = threading.Lock()  # algorithms may run in several threads
+
+
+def configured_pool_size():
+    """Return the pool size set in the Processing options, or os.cpu_count()
+
+    Reads ProcessingConfig, so it must be called from the main thread, e.g.
+    when the algorithm parameters are prepared. The pool functions get the
+    size passed in.
+    """
+    try:
+        from processing.core.ProcessingConfig import ProcessingConfig
+
+        size = ProcessingConfig.getSetting(WORKER_POOL_SIZE)
+    except ImportError:
+        size = None
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        size = 0
+    return size if size > 0 else os.cpu_count()
+
+
+def available_memory():
+    """Return the available physical memory in bytes, or None if unknown"""
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def plan_workers(
+    n_trajs, data_bytes, workers=0, task_size=0, memory_budget=0, pool_size=0
+):
+    """Return (number of workers, trajectories per task) for a parallel run
+
+    Arguments that are 0 are chosen automatically: pool_size, the size of the
+    pool the run uses, defaults to workers or else to os.cpu_count(), workers
+    to the pool size, memory_budget (bytes per worker) to an equal share of
+    the available memory, and task_size to as many trajectories as fit the
+    memory budget, but at most TASKS_PER_WORKER tasks per worker. There are
+    never more workers than the pool has, and fewer if their memory budgets
+    exceed the available memory or if there are fewer tasks than workers.
+    """
+    pool_size = pool_size or workers or os.cpu_count()
+    workers = min(workers or pool_size, pool_size)
+    available = available_memory()
+    if memory_budget and available:
+        workers = min(workers, max(1, int(available // memory_budget)))
+    elif available:
+        memory_budget = available / workers
+    if not task_size:
+        task_size = math.ceil(n_trajs / (workers * TASKS_PER_WORKER))
+        if memory_budget:
+            traj_bytes = WORKER_MEMORY_FACTOR * data_bytes / max(n_trajs, 1)
+            task_size = min(task_size, int(memory_budget // max(traj_bytes, 1)))
+        task_size = max(1, task_size)
+    workers = max(1, min(workers, math.ceil(n_trajs / task_size)))
+    return workers, task_size
+
+
+@contextmanager
+def worker_pool(size):
+    """Context manager returning the shared worker pool, created on first use
+
+    The pool is kept alive across algorithm runs, so worker processes only
+    import pandas, shapely and MovingPandas once. Algorithms running in
+    different threads share it. The pool has size workers, see
+    configured_pool_size(). The pool is only resized once it is not in use,
+    until then runs share the pool of the current size.
+    """
+    global _pool, _pool_size, _pool_users
+    with _pool_lock:
+        if _pool is not None and _pool_size != size and _pool_users == 0:
+            _terminate_pool()
+        if _pool is None:
+            _pool = multiprocessing.Pool(size)
+            _pool_size = size
+        _pool_users += 1
+        pool = _pool
+    try:
+        yield pool
+    finally:
+        with _pool_lock:
+            _pool_users -= 1
+
+
+def _terminate_pool():
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+    _pool = None
+    _pool_size = None
+
+
+def shutdown_worker_pool():
+    """Stop the shared worker pool, if it is running"""
+    with _pool_lock:
+        _terminate_pool()
+
+
+atexit.register(shutdown_worker_pool)
+
+
+def partition(items, n_parts):
+    """Split items into at most n_parts contiguous lists of similar length"""
+    n_parts = max(1, min(n_parts, len(items)))
+    size, rest = divmod(len(items), n_parts)
+    parts = []
+    start = 0
+    for i in range(n_parts):
+        end = start + size + (1 if i < rest else 0)
+        parts.append(items[start:end])
+        start = end
+    return parts
+
+
+def task_parts(items, n_processes, task_size=None):
+    """Split items into tasks of task_size items, or TASKS_PER_WORKER per worker"""
+    if task_size:
+        return [items[i : i + task_size] for i in range(0, len(items), task_size)]
+    return partition(items, n_processes * TASKS_PER_WORKER)
+
+
+def weighted_task_parts(items, weights, n_processes, task_size=None):
+    """Split items into contiguous tasks of about task_size total weight
+
+    Without a task_size, the total weight is spread over TASKS_PER_WORKER
+    tasks per worker.
+    """
+    if not task_size:
+        task_size = math.ceil(sum(weights) / (n_processes * TASKS_PER_WORKER))
+    parts, part, size = [], [], 0
+    for item, weight in zip(items, weights):
+        part.append(item)
+        size += weight
+        if size >= task_size:
+            parts.append(part)
+            part, size = [], 0
+    if part:
+        parts.append(part)
+    return parts
+
+
+class SharedArrays:
+    """Context manager placing NumPy arrays in shared memory for the pool
+
+    Only the block names, dtypes and shapes in spec are sent to the workers,
+    which map the blocks without copying them. The blocks are released when
+    the context exits.
+    """
+
+    def __init__(self, **arrays):
+        self.blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self.blocks.append(shm)
+            np.ndarray(array.shape, array.dtype, buffer=shm.buf)[:] = array
+            self.spec[name] = (shm.name, array.dtype.str, array.shape)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+
+def _call(task):
+    fun, args = task
+    return fun(*args)
+
+
+def imap_bounded(fun, tasks, n_processes, pool_size=None):
+    """Yield fun(task) for tasks in order, running at most n_processes at once
+
+    The tasks run in the shared pool of pool_size workers, n_processes by
+    default, see worker_pool(). The pool may have more workers than this run
+    is allowed to use, or fewer while another run uses it, in which case the
+    tasks wait for a free worker.
+    """
+    pending = deque()
+    with worker_pool(pool_size or n_processes) as pool:
+        for task in tasks:
+            pending.append(pool.apply_async(fun, (task,)))
+            if len(pending) >= n_processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def _call_shared(task):
+    fun, spec, args = task
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in spec.values()]
+    arrays = None
+    try:
+        arrays = {
+            name: np.ndarray(shape, dtype, buffer=shm.buf)
+            for (name, (_, dtype, shape)), shm in zip(spec.items(), blocks)
+        }
+        return fun(arrays, *args)
+    finally:
+        arrays = None  # release the buffers before closing the blocks
+        for shm in blocks:
+            shm.close()
+
+
+def imap_shared(fun, arrays, tasks, n_processes, pool_size=None):
+    """Yield fun(arrays, *task) for tasks in order, like imap_bounded()
+
+    arrays is a dict of NumPy arrays, which are placed in shared memory once
+    instead of being sent with every task. fun must not return views of them.
+    """
+    with SharedArrays(**arrays) as shared:
+        yield from imap_bounded(
+            _call_shared,
+            [(fun, shared.spec, task) for task in tasks],
+            n_processes,
+            pool_size,
+        )
+
+
+def _map_trajectories(arrays, positions, ids, layout, fun, args):
+    return fun(trajectories_from_arrays(arrays, positions, ids, layout), *args)
+
+
+def map_trajectories_in_pool(
+    fun, tc, n_processes, *args, task_size=None, pool_size=None
+):
+    """Apply fun(trajs, *args) to parts of the trajectories of tc in the pool
+
+    Only the coordinates and timestamps of the points are sent to the
+    workers, through shared memory, and each task gets the positions and IDs
+    of its trajectories. The workers rebuild these without their other
+    columns, see trajectories_from_arrays(). Returns (positions, result) for
+    each task, in order.
+    """
+    trajs = tc.trajectories
+    if not trajs:
+        return []
+    parts = task_parts(np.arange(len(trajs)), n_processes, task_size)
+    layout = point_layout(trajs[0])
+    tasks = [(part, [trajs[i].id for i in part], layout, fun, args) for part in parts]
+    results = imap_shared(
+        _map_trajectories, point_arrays(trajs), tasks, n_processes, pool_size
+    )
+    return list(zip(parts, results))
+
+
+def _add_metrics(trajs, speed_units):
+    metrics = []
+    for traj in trajs:
+        traj.add_speed(overwrite=True, units=speed_units)
+        traj.add_direction(overwrite=True)
+        metrics.append(
+            (
+                traj.df[traj.get_speed_col()].to_numpy(),
+                traj.df[traj.get_direction_col()].to_numpy(),
+            )
+        )
+    return metrics
+
+
+def _apply(trajs, processor_class, method, min_length, kwargs):
+    tc = TrajectoryCollection(trajs)  # trajs are already long enough
+    tc.min_length = min_length  # applied to the splits
+    return trajectory_rows(getattr(processor_class(tc), method)(**kwargs).trajectories)
+
+
+def _stop_points(trajs, max_diameter, min_duration):
+    return TrajectoryStopDetector(TrajectoryCollection(trajs)).get_stop_points(
+        max_diameter=max_diameter, min_duration=min_duration
+    )
+
+
+def add_metrics_in_pool(tc, speed_units, n_processes, task_size=None, pool_size=None):
+    """Add speed and direction columns to all trajectories of tc
+
+    The workers only compute the columns, which are added here.
+    """
+    if n_processes < 2:
+        tc.add_speed(units=tuple(speed_units), overwrite=True)
+        tc.add_direction(overwrite=True)
+        return
+    results = map_trajectories_in_pool(
+        _add_metrics,
+        tc,
+        n_processes,
+        tuple(speed_units),
+        task_size=task_size,
+        pool_size=pool_size,
+    )
+    for positions, metrics in results:
+        for position, (speed, direction) in zip(positions, metrics):
+            traj = tc.trajectories[position]
+            traj.df[traj.get_speed_col()] = speed
+            traj.df[traj.get_direction_col()] = direction
+
+
+def apply_in_pool(
+    processor_class, method, tc, n_processes, task_size=None, pool_size=None, **kwargs
+):
+    """Run processor_class(tc).method(**kwargs) on partitions of tc in the pool
+
+    For MovingPandas splitters, generalizers, smoothers and cleaners, which
+    process each trajectory independently. The workers return the source
+    rows of the points they keep or add, the results get the columns of
+    these rows here and are merged in order.
+    """
+    if n_processes < 2:
+        return getattr(processor_class(tc), method)(**kwargs)
+    results = map_trajectories_in_pool(
+        _apply,
+        tc,
+        n_processes,
+        processor_class,
+        method,
+        tc.min_length,
+        kwargs,
+        task_size=task_size,
+        pool_size=pool_size,
+    )
+    offsets = trajectory_offsets(tc.trajectories)
+    result = copy(tc)
+    result.trajectories = [
+        traj
+        for _, rows in results
+        for traj in trajectories_from_rows(tc.trajectories, offsets, rows)
+    ]
+    return result
+
+
+def split_in_pool(
+    splitter_class, tc, n_processes, task_size=None, pool_size=None, **kwargs
+):
+    """Split a TrajectoryCollection with a MovingPandas splitter in the pool"""
+    return apply_in_pool(
+        splitter_class,
+        "split",
+        tc,
+        n_processes,
+        task_size=task_size,
+        pool_size=pool_size,
+        **kwargs,
+    )
+
+
+def stop_points_in_pool(
+    tc, n_processes, max_diameter, min_duration, task_size=None, pool_size=None
+):
+    """Return the stop points of all trajectories of tc as a GeoDataFrame"""
+    if n_processes < 2 or not tc.trajectories:
+        return TrajectoryStopDetector(tc).get_stop_points(
+            max_diameter=max_diameter, min_duration=min_duration
+        )
+    gdfs = [
+        gdf
+        for _, gdf in map_trajectories_in_pool(
+            _stop_points,
+            tc,
+            n_processes,
+            max_diameter,
+            min_duration,
+            task_size=task_size,
+            pool_size=pool_size,
+        )
+    ]
+    return pd.concat(gdfs) if len(gdfs) > 1 else gdfs[0]
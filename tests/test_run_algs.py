@@ -69,3 +69,69 @@ def test_run_create_trajectory_with_wrong_time_field():
     }
     with pytest.raises(QgsProcessingException):
         run("Trajectory:create_trajectory", alg_params)
+
+
+def test_run_create_trajectory_algorithm_in_chunks():
+    Processing.initialize()
+    provider = TrajectoolsProvider()
+    QgsApplication.processingRegistry().addProvider(provider)
+
+    alg_params = {
+        "INPUT": TESTDATA,
+        "TRAJ_ID_FIELD": "trajectory_id",
+        "TIME_FIELD": "t",
+        "OUTPUT_PTS": "TEMPORARY_OUTPUT",
+        "OUTPUT_TRAJS": "TEMPORARY_OUTPUT",
+        "FIELDS_TO_ADD": [],
+        "ADD_METRICS": True,
+        "USE_PARALLEL_PROCESSING": False,
+        "SPEED_UNIT": "km/h",
+        "MIN_LENGTH": 0,
+        "CHUNK_SIZE": 500,
+    }
+    result = run("Trajectory:create_trajectory", alg_params)
+    assert result["OUTPUT_TRAJS"].featureCount() == 5
+
+
+def test_run_create_trajectory_algorithm_without_points_output():
+    Processing.initialize()
+    provider = TrajectoolsProvider()
+    QgsApplication.processingRegistry().addProvider(provider)
+
+    alg_params = {
+        "INPUT": TESTDATA,
+        "TRAJ_ID_FIELD": "trajectory_id",
+        "TIME_FIELD": "t",
+        "OUTPUT_PTS": None,
+        "OUTPUT_TRAJS": "TEMPORARY_OUTPUT",
+        "FIELDS_TO_ADD": [],
+        "ADD_METRICS": True,
+        "USE_PARALLEL_PROCESSING": False,
+        "SPEED_UNIT": "km/h",
+        "MIN_LENGTH": 0,
+    }
+    result = run("Trajectory:create_trajectory", alg_params)
+    assert result["OUTPUT_PTS"] is None
+    assert result["OUTPUT_TRAJS"].featureCount() == 5
+
+
+def test_run_extract_stops_algorithm_in_parallel():
+    Processing.initialize()
+    provider = TrajectoolsProvider()
+    QgsApplication.processingRegistry().addProvider(provider)
+
+    alg_params = {
+        "INPUT": TESTDATA,
+        "TRAJ_ID_FIELD": "trajectory_id",
+        "TIME_FIELD": "t",
+        "MAX_DIAMETER": 30,
+        "MIN_DURATION": "1 minutes",
+        "STOP_PTS": "TEMPORARY_OUTPUT",
+        "USE_PARALLEL_PROCESSING": False,
+    }
+    expected = run("Trajectory:extract_stop_pts", alg_params)
+    alg_params["USE_PARALLEL_PROCESSING"] = True
+    alg_params["WORKERS"] = 2
+    alg_params["TASK_SIZE"] = 1
+    result = run("Trajectory:extract_stop_pts", alg_params)
+    assert result["STOP_PTS"].featureCount() == expected["STOP_PTS"].featureCount()
@@ -1,6 +1,74 @@
-from qgis.core import QgsGeometry, QgsVectorLayer
-from qgis_processing.qgisUtils import tc_from_pt_layer
-
+import pickle
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+from qgis.core import (
+    NULL,
+    QgsFeature,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProcessingException,
+    QgsVectorLayer,
+)
+from qgis.PyQt.QtCore import QDate, QDateTime, QTime
+from datetime import datetime, timedelta
+from movingpandas import (
+    DouglasPeuckerGeneralizer,
+    ObservationGapSplitter,
+    OutlierCleaner,
+    TemporalSplitter,
+    ValueChangeSplitter,
+)
+from qgis_processing.ingestionCache import cache_key, load_cached_df, store_cached_df
+from qgis_processing.extentClip import clip_by_extent
+from qgis_processing.overlayCache import (
+    clear_overlay_cache,
+    overlay_geometries,
+    overlay_key,
+    tile_geometry,
+    TILE_MAX_VERTICES,
+)
+from qgis_processing.spatialIndex import iter_clips, iter_intersections
+from qgis_processing.workerPool import (
+    add_metrics_in_pool,
+    apply_in_pool,
+    plan_workers,
+    partition,
+    split_in_pool,
+    shutdown_worker_pool,
+    stop_points_in_pool,
+)
+from qgis_processing.trajectoryKernels import (
+    split_table_at_gaps,
+    split_table_at_value_changes,
+    trajectories_from_table,
+    traj_xy,
+)
+from qgis_processing.qgisUtils import (
+    tc_from_pt_layer,
+    df_from_pt_layer,
+    df_from_pt_features,
+    df_chunks_from_pt_layer,
+    df_from_ogr_file,
+    ogr_file_source,
+    guess_timestamp_format,
+    parse_timestamps,
+    filter_time_range,
+    pt_layer_request,
+    time_filter_range,
+    compact_dtypes,
+    linestringm_from_traj,
+    traj_summaries,
+    python_values,
+    qgis_values,
+    features_from_gdf,
+    tc_from_df,
+    qgis_from_shapely,
+    shapely_from_qgis,
+    shapely_from_source,
+)
 
 TESTDATA = "./sample_data/geolife.gpkg"
 ID_COL = "trajectory_id"
@@ -37,3 +105,474 @@ def test_tc_from_pt_layer_with_none_values():
     vl = QgsVectorLayer(TESTDATA, "test data")
     tc = tc_from_pt_layer(vl, TIME_COL_DT_WITH_NONE, ID_COL)
     assert len(tc) == 5
+
+
+def test_df_from_pt_layer_in_chunks():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    df = df_from_pt_features(vl)
+    df_chunked = df_from_pt_features(vl, chunk_size=7)
+    assert len(df) == vl.featureCount()
+    assert df_chunked.equals(df)
+
+
+def test_df_chunks_from_pt_layer_rejects_unsorted_input():
+    vl = QgsVectorLayer(
+        "Point?crs=epsg:4326&field=trajectory_id:integer&field=t:datetime",
+        "unsorted",
+        "memory",
+    )
+    features = []
+    for i, traj_id in enumerate([1, 1, 2, 2, 1, 1]):
+        feature = QgsFeature(vl.fields())
+        feature.setAttributes([traj_id, QDateTime(QDate(2020, 1, 1), QTime(0, i))])
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(i, i)))
+        features.append(feature)
+    vl.dataProvider().addFeatures(features)
+    chunks = df_chunks_from_pt_layer(vl, "t", ID_COL, chunk_size=2)
+    with pytest.raises(QgsProcessingException):
+        list(chunks)
+
+
+def test_df_from_pt_layer_with_field_subset():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    df = df_from_pt_layer(vl, TIME_COL_DT, ID_COL, field_names=[ID_COL, TIME_COL_DT])
+    assert list(df.columns) == [ID_COL, TIME_COL_DT, "geom_x", "geom_y"]
+
+
+def test_parse_timestamps_with_string_format_and_none():
+    values = pd.Series(["2008-12-11 04:42:14+00", None, "2008-12-11 04:42:16+00"])
+    assert guess_timestamp_format(values) == "%Y-%m-%d %H:%M:%S%z"
+    parsed = parse_timestamps(values)
+    assert parsed.iloc[0] == pd.Timestamp("2008-12-11 04:42:14", tz="UTC")
+    assert pd.isna(parsed.iloc[1])
+
+
+def test_df_from_ogr_file_matches_provider():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    file_source = ogr_file_source(vl)
+    if file_source is None:
+        pytest.skip("pyogrio and pyarrow are required for the OGR fast path")
+    file_path, layer_name, fid_field = file_source
+    df = df_from_ogr_file(file_path, layer_name, fid_field=fid_field)
+    expected = df_from_pt_features(vl)
+    assert list(df.columns) == list(expected.columns)
+    assert df["geom_x"].tolist() == expected["geom_x"].tolist()
+
+
+def test_filter_time_range_with_naive_and_aware_timestamps():
+    times = pd.date_range("2024-01-01", periods=5, freq="h")
+    start, end = datetime(2024, 1, 1, 1), datetime(2024, 1, 1, 3)
+    for t in [times, times.tz_localize("UTC")]:
+        df = pd.DataFrame({"t": t, "v": range(5)})
+        for bounds in [
+            (start, end),
+            (pd.Timestamp(start, tz="UTC"), pd.Timestamp(end, tz="UTC")),
+        ]:
+            assert filter_time_range(df, "t", *bounds)["v"].tolist() == [1, 2, 3]
+        assert filter_time_range(df, "t", start_time=start)["v"].tolist() == [
+            1,
+            2,
+            3,
+            4,
+        ]
+        assert filter_time_range(df, "t", end_time=end)["v"].tolist() == [0, 1, 2, 3]
+
+
+def test_df_from_pt_layer_with_time_window():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    start, end = datetime(2009, 2, 1), datetime(2009, 3, 1)
+    # timestamps are tz-aware when read from the file, naive through QGIS
+    df = df_from_pt_layer(vl, TIME_COL_DT, ID_COL, start_time=start, end_time=end)
+    vl.setSubsetString(f"{ID_COL} IS NOT NULL")  # read through the provider
+    expected = df_from_pt_layer(vl, TIME_COL_DT, ID_COL, start_time=start, end_time=end)
+    assert len(df) == len(expected) == 2681
+    assert expected[TIME_COL_DT].between(start, end).all()
+
+
+def test_time_window_is_applied_while_reading():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    start, end = datetime(2009, 2, 1), datetime(2009, 3, 1)
+    time_range = time_filter_range(vl, TIME_COL_DT, start, end)
+    assert time_range == ("2009-01-31T00:00:00", "2009-03-02T00:00:00")
+    assert time_filter_range(vl, TIME_COL_STR, start, end) is None
+    _, request = pt_layer_request(vl, None, None, TIME_COL_DT, time_range)
+    assert 2681 <= len(list(vl.getFeatures(request))) < vl.featureCount()
+    df = df_from_pt_features(
+        vl, chunk_size=100, time_field_name=TIME_COL_DT, start_time=start, end_time=end
+    )
+    assert len(df) == 2681
+
+
+def half_extent(layer):
+    extent = layer.extent()
+    extent.setXMaximum((extent.xMinimum() + extent.xMaximum()) / 2)
+    return extent
+
+
+def test_pt_layer_request_with_extent():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    extent = half_extent(vl)
+    indices, request = pt_layer_request(vl, [ID_COL], extent)
+    points = [f.geometry().asPoint() for f in vl.getFeatures(request)]
+    expected = [
+        f.geometry().asPoint()
+        for f in vl.getFeatures()
+        if extent.contains(f.geometry().asPoint())
+    ]
+    assert indices == [vl.fields().indexFromName(ID_COL)]
+    assert 0 < len(points) < vl.featureCount()
+    assert points == expected
+
+
+def test_df_from_ogr_file_with_extent():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    file_source = ogr_file_source(vl)
+    if file_source is None:
+        pytest.skip("pyogrio and pyarrow are required for the OGR fast path")
+    file_path, layer_name, fid_field = file_source
+    extent = half_extent(vl)
+    df = df_from_ogr_file(file_path, layer_name, fid_field=fid_field, extent=extent)
+    expected = df_from_pt_features(vl, extent=extent)
+    assert 0 < len(df) < vl.featureCount()
+    assert (df["geom_x"] <= extent.xMaximum()).all()
+    assert df["geom_x"].tolist() == expected["geom_x"].tolist()
+
+
+def test_ingestion_cache_round_trip(tmp_path):
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    key = cache_key(vl, TIME_COL_STR, ID_COL)
+    if key is None:
+        pytest.skip("pyarrow is required for the ingestion cache")
+    assert load_cached_df(key, cache_dir=tmp_path) is None
+    df = df_from_pt_layer(vl, TIME_COL_STR, ID_COL, field_names=[ID_COL, TIME_COL_STR])
+    assert store_cached_df(key, df, cache_dir=tmp_path)
+    cached = load_cached_df(key, cache_dir=tmp_path)
+    assert cached["geom_x"].tolist() == df["geom_x"].tolist()
+    assert cache_key(vl, TIME_COL_DT, ID_COL) != key
+
+
+def test_compact_dtypes_keeps_values():
+    df = pd.DataFrame(
+        {
+            ID_COL: ["a", "a", "b", "b"],
+            "count": [1, 2, 3, 4],
+            "speed": [0.5, 1.25, None, 2.0],
+            "precise": [0.1, 0.2, 0.3, 0.4],
+        }
+    )
+    expected = df.copy()
+    compact_dtypes(df, ID_COL)
+    assert df[ID_COL].dtype == "category"
+    assert df["count"].dtype == "int8"
+    assert df["speed"].dtype == "float32"
+    assert df["precise"].dtype == "float64"
+    pd.testing.assert_frame_equal(
+        df, expected, check_dtype=False, check_categorical=False
+    )
+
+
+def test_linestringm_from_traj_matches_wkt():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    traj = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL).trajectories[0]
+    expected = QgsGeometry.fromWkt(traj.to_linestringm_wkt())
+    assert linestringm_from_traj(traj).asWkt(3) == expected.asWkt(3)
+
+
+def test_traj_summaries_match_trajectory_methods():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    tc = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    start, end, duration, length, tracker = traj_summaries(
+        tc.trajectories, "km", attr_first_to_add=["tracker"]
+    )
+    for i, traj in enumerate(tc.trajectories):
+        assert start[i] == traj.get_start_time()
+        assert end[i] == traj.get_end_time()
+        assert duration[i] == traj.get_duration().total_seconds()
+        assert length[i] == pytest.approx(traj.get_length(units="km"))
+        assert tracker[i] == float(traj.df["tracker"].iloc[0])
+
+
+def test_df_from_pt_layer_with_none_values_is_picklable():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    df = df_from_pt_features(vl)
+    assert pd.api.types.is_datetime64_any_dtype(df[TIME_COL_DT_WITH_NONE])
+    assert df[TIME_COL_DT_WITH_NONE].isna().any()
+    assert pickle.loads(pickle.dumps(df)).equals(df)
+
+
+def test_python_values_converts_qdates():
+    column = np.array([QDate(2024, 1, 31), None], dtype=object)
+    result = python_values(column)
+    assert result[0] == np.datetime64("2024-01-31")
+    assert np.isnat(result[1])
+
+
+def test_qgis_values_converts_missing_values_and_datetimes():
+    times = pd.Series(pd.to_datetime(["2024-01-31 12:30:00", None]))
+    result = qgis_values(times)
+    assert result[0] == QDateTime(QDate(2024, 1, 31), QTime(12, 30))
+    assert result[1] is None
+    assert qgis_values(pd.Series([1.5, np.nan])) == [1.5, None]
+
+
+def test_features_from_gdf_builds_batches():
+    times = ["2024-01-31 12:30", None, "2024-02-01 00:00", "2024-02-02 00:00", None]
+    gdf = gpd.GeoDataFrame(
+        {"t": pd.to_datetime(times), "v": [1.0, 2.0, np.nan, 4.0, 5.0]},
+        geometry=shapely.points(np.arange(5), np.arange(5)),
+    )
+    batches = list(features_from_gdf(gdf, ["t", "v"], batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    features = [f for batch in batches for f in batch]
+    assert [f.geometry().asPoint().x() for f in features] == [0, 1, 2, 3, 4]
+    assert features[0].attributes() == [
+        QDateTime(QDate(2024, 1, 31), QTime(12, 30)),
+        1.0,
+    ]
+    assert features[1].attributes()[0] == NULL
+    assert features[2].attributes()[1] == NULL
+    assert features[4].attributes()[1] == 5.0
+
+
+def test_wkb_geometry_exchange_is_exact():
+    polygon = shapely.Polygon([(0.1, 0.2), (10.123456789012, 0), (10, 10), (0.1, 0.2)])
+    qgs_polygon = qgis_from_shapely(polygon)
+    assert qgs_polygon.area() == polygon.area
+    assert shapely.equals_exact(shapely_from_qgis(qgs_polygon), polygon, 0)
+    assert shapely_from_qgis(QgsGeometry()) is None
+
+
+def test_shapely_from_source_reads_all_features():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    geometries, properties = shapely_from_source(vl)
+    assert len(geometries) == len(properties) == vl.featureCount()
+    assert all(shapely.get_type_id(geometries) == 0)  # points
+    assert ID_COL in properties[0]
+
+
+def test_tile_geometry_covers_polygon():
+    polygon = shapely.Point(0, 0).buffer(10, quad_segs=200)
+    tiles = tile_geometry(polygon, max_vertices=100)
+    assert len(tiles) > 1
+    assert max(shapely.get_num_coordinates(tiles)) <= 100
+    assert shapely.union_all(tiles).area == pytest.approx(polygon.area)
+
+
+def test_tile_geometry_keeps_invalid_polygon_whole():
+    angles = np.linspace(0, 14 * np.pi, 600, endpoint=False)
+    radii = 1 + angles
+    polygon = shapely.Polygon(np.c_[np.cos(angles) * radii, np.sin(angles) * radii])
+    assert not polygon.is_valid
+    assert shapely.get_num_coordinates(polygon) > TILE_MAX_VERTICES
+    assert tile_geometry(polygon) == [polygon]
+
+
+def test_overlay_geometries_are_reused_until_layer_changes():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    key = overlay_key(vl)
+    assert key is not None
+    try:
+        overlay = overlay_geometries(vl, key)
+        assert overlay_geometries(vl, key) is overlay
+        assert overlay_geometries(vl) is not overlay
+        assert len(overlay.geometries) == len(overlay.tiles) == vl.featureCount()
+    finally:
+        clear_overlay_cache()
+
+
+def test_partition_keeps_order():
+    parts = partition(list(range(7)), 3)
+    assert parts == [[0, 1, 2], [3, 4], [5, 6]]
+    assert partition([1], 4) == [[1]]
+
+
+def test_split_in_pool_matches_serial_split():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    tc = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    expected = TemporalSplitter(tc).split(mode="hour")
+    try:
+        result = split_in_pool(TemporalSplitter, tc, 2, mode="hour")
+        result_again = split_in_pool(TemporalSplitter, tc, 2, mode="hour")
+    finally:
+        shutdown_worker_pool()
+    assert [t.id for t in result] == [t.id for t in expected]
+    assert len(result_again) == len(expected)
+
+
+def test_split_table_at_gaps_matches_serial_split():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    tc = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    gap = timedelta(minutes=5)
+    table, ids, offsets = split_table_at_gaps(tc, gap)
+    result = trajectories_from_table(table, ids, offsets, tc.trajectories[0])
+    expected = []
+    for traj in tc.trajectories:
+        expected.extend(ObservationGapSplitter(traj).split(gap=gap).trajectories)
+    assert ids == [t.id for t in expected]
+    assert len(table) == offsets[-1] == sum(len(t.df) for t in expected)
+    for a, b in zip(result, expected):
+        assert (a.df.index == b.df.index).all()
+        assert np.allclose(traj_xy(a), traj_xy(b))
+        assert (a.df[ID_COL] == b.df[ID_COL]).all()
+
+
+def test_split_table_at_value_changes_matches_serial_split():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    tc = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    for col_name in ["tracker", TIME_COL_DT_WITH_NONE]:
+        table, ids, offsets = split_table_at_value_changes(tc, col_name)
+        result = trajectories_from_table(table, ids, offsets, tc.trajectories[0])
+        expected = []
+        for traj in tc.trajectories:
+            splits = ValueChangeSplitter(traj).split(col_name=col_name)
+            expected.extend(splits.trajectories)
+        assert ids == [t.id for t in expected]
+        assert len(table) == offsets[-1] == sum(len(t.df) for t in expected)
+        for a, b in zip(result, expected):
+            assert (a.df.index == b.df.index).all()
+            assert np.allclose(traj_xy(a), traj_xy(b))
+            assert (a.df[ID_COL] == b.df[ID_COL]).all()
+
+
+def test_apply_in_pool_matches_serial_generalization():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    tc = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    expected = DouglasPeuckerGeneralizer(tc).generalize(tolerance=0.001)
+    try:
+        result = apply_in_pool(
+            DouglasPeuckerGeneralizer, "generalize", tc, 2, tolerance=0.001
+        )
+    finally:
+        shutdown_worker_pool()
+    assert [t.id for t in result] == [t.id for t in expected]
+    assert all(a.df.equals(b.df) for a, b in zip(result, expected))
+
+
+def test_apply_in_pool_keeps_columns_of_cleaned_points():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    tc = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    expected = OutlierCleaner(tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)).clean(alpha=2)
+    try:
+        result = apply_in_pool(OutlierCleaner, "clean", tc, 2, task_size=1, alpha=2)
+    finally:
+        shutdown_worker_pool()
+    assert [t.id for t in result] == [t.id for t in expected]
+    for a, b in zip(result, expected):
+        assert a.df.index.equals(b.df.index)
+        assert np.allclose(traj_xy(a), traj_xy(b))
+        assert a.df["sequence"].equals(b.df["sequence"])
+        assert np.allclose(a.df["speed"], b.df["speed"])
+
+
+def test_metrics_and_stop_points_in_pool_match_serial():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    tc = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    expected = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    add_metrics_in_pool(expected, ("km", "h"), 1)
+    try:
+        add_metrics_in_pool(tc, ("km", "h"), 2, task_size=2)
+        stops = stop_points_in_pool(tc, 2, 30, timedelta(minutes=1), task_size=1)
+    finally:
+        shutdown_worker_pool()
+    for a, b in zip(tc.trajectories, expected.trajectories):
+        assert np.allclose(a.df["speed"], b.df["speed"])
+        assert np.allclose(a.df["direction"], b.df["direction"])
+    assert stops.equals(stop_points_in_pool(expected, 1, 30, timedelta(minutes=1)))
+
+
+def test_iter_clips_matches_clipping_each_polygon():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    tc = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    minx, miny, maxx, maxy = tc.to_point_gdf().total_bounds
+    dx, dy = (maxx - minx) / 2, (maxy - miny) / 2
+    polygons = [
+        shapely.box(minx + i * dx, miny + j * dy, minx + (i + 1) * dx, maxy)
+        for i in range(2)
+        for j in range(2)
+    ]
+    expected = [t.id for polygon in polygons for t in tc.clip(polygon)]
+    for n_processes in [1, 2]:
+        try:
+            result = [
+                t.id
+                for batch in iter_clips(tc, polygons, n_processes, task_size=2)
+                for t in batch
+            ]
+        finally:
+            shutdown_worker_pool()
+        assert result == expected
+
+
+def test_iter_intersections_adds_polygon_properties():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    tc = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    minx, miny, maxx, maxy = tc.to_point_gdf().total_bounds
+    polygons = [
+        shapely.box(minx, miny, (minx + maxx) / 2, maxy),
+        shapely.box(maxx + 1, maxy + 1, maxx + 2, maxy + 2),
+    ]
+    properties = [{"name": "west"}, {"name": "outside"}]
+    expected = tc.intersection({"geometry": polygons[0], "properties": properties[0]})
+    result = [
+        t for batch in iter_intersections(tc, polygons, properties, 1) for t in batch
+    ]
+    assert [t.id for t in result] == [t.id for t in expected]
+    assert all(a.df.equals(b.df) for a, b in zip(result, expected))
+    assert set(result[0].df["intersecting_name"]) == {"west"}
+
+
+def test_clip_by_extent_matches_polygon_clip():
+    rng = np.random.default_rng(0)
+    n = 1000
+    df = pd.DataFrame(
+        {
+            ID_COL: np.repeat(np.arange(10), n // 10),
+            "geom_x": np.cumsum(rng.normal(size=n)),
+            "geom_y": np.cumsum(rng.normal(size=n)),
+            "t": pd.Timestamp("2020-01-01") + pd.to_timedelta(np.arange(n), unit="s"),
+            "value": np.arange(n),
+        }
+    )
+    extent = (-10, -5, 5, 10)
+    result = clip_by_extent(tc_from_df(df.copy(), "t", ID_COL, 3857), *extent)
+    expected = tc_from_df(df.copy(), "t", ID_COL, 3857).clip(shapely.box(*extent))
+    assert [t.id for t in result] == [t.id for t in expected]
+    for a, b in zip(result, expected):
+        assert np.allclose(traj_xy(a), traj_xy(b))
+        assert (abs(a.df.index - b.df.index) < pd.Timedelta("1ms")).all()
+        assert (a.df["value"].values == b.df["value"].values).all()
+
+
+def test_clip_by_extent_keeps_contiguous_runs_in_extent():
+    vl = QgsVectorLayer(TESTDATA, "test data")
+    tc = tc_from_pt_layer(vl, TIME_COL_DT, ID_COL)
+    minx, miny, maxx, maxy = tc.to_point_gdf().total_bounds
+    extent = (minx, miny, (minx + maxx) / 2, (miny + maxy) / 2)
+    box = shapely.box(*extent)
+    result = clip_by_extent(tc, *extent)
+    runs = 0
+    for traj in tc.trajectories:
+        xs, ys = traj_xy(traj)
+        start, end = np.c_[xs[:-1], ys[:-1]], np.c_[xs[1:], ys[1:]]
+        lines = shapely.linestrings(np.stack([start, end], axis=1))
+        inside = shapely.length(shapely.intersection(lines, box)) > 0
+        inside |= (shapely.length(lines) == 0) & shapely.intersects(lines, box)
+        runs += np.count_nonzero(np.diff(inside.astype(int), prepend=0) == 1)
+    assert len(result) == runs == 5
+    for traj in result:
+        assert shapely.covers(box.buffer(1e-9), shapely.points(*traj_xy(traj))).all()
+    # MovingPandas also splits where a trajectory crosses itself
+    assert len(tc.clip(box)) > len(result)
+
+
+def test_plan_workers_respects_explicit_settings():
+    assert plan_workers(1000, 10**6, workers=2, task_size=7) == (2, 7)
+    assert plan_workers(10, 10**6, workers=8, task_size=5) == (2, 5)
+    workers, task_size = plan_workers(1000, 10**6, workers=2)
+    assert workers == 2
+    assert task_size <= 125
+
+
+def test_plan_workers_uses_at_most_the_pool():
+    assert plan_workers(1000, 10**6, workers=8, task_size=7, pool_size=4) == (4, 7)
+    assert plan_workers(1000, 10**6, task_size=7, pool_size=3) == (3, 7)